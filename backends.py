@@ -0,0 +1,347 @@
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from sheet_cache import expire_epoch, norm_email
+
+
+def row_ranges(row_numbers):
+    """[5, 6, 7, 10] -> [(5, 7), (10, 10)] (inklusif, urut naik)."""
+    out = []
+    for rn in sorted(set(row_numbers)):
+        if out and rn == out[-1][1] + 1:
+            out[-1] = (out[-1][0], rn)
+        else:
+            out.append((rn, rn))
+    return out
+
+
+def fit_rows(target, headers, rows):
+    """Susun ulang baris (urutan `headers`) ke urutan kolom `target`; kolom yang gak ada = ""."""
+    idx = {h: i for i, h in reversed(list(enumerate(headers)))}
+    pick = [idx.get(h) for h in target]
+    return [[row[i] if i is not None and i < len(row) else "" for i in pick] for row in rows]
+
+
+# key tab arsip di engine non-sheet (SQLite)
+ARCHIVE_KEY_SUFFIX = "__arsip"
+
+
+def archive_key(app_key: str) -> str:
+    return app_key + ARCHIVE_KEY_SUFFIX
+
+
+# ==========================================================
+# INTERFACE
+# ==========================================================
+class StorageBackend:
+    """
+    Tempat data akun disimpan. Bentuk datanya sama kayak tab Google Sheet:
+    row 1 header, data mulai row 2, tulis/hapus pakai nomor baris.
+
+    load_tabs(app_keys, header_only=False) -> {app_key: values (list of list) atau Exception}
+    append_rows(app_key, rows)
+    write_cells(app_key, cells)        cells: (row_number, col_index_0, value)
+    delete_rows(app_key, row_numbers)
+    replace_tab(app_key, values)       timpa satu tab penuh (header + data)
+    append_archive(app_key, headers, rows)  tambah baris ke arsip app (dibuat kalau belum ada)
+    load_archives(app_keys)            -> {app_key: values arsip atau Exception}; belum ada = []
+    add_column(app_key, name)          tambah header baru di ujung kanan row 1
+    reload()                           refresh metadata (kalau ada)
+    """
+
+    name = "base"
+
+    def load_tabs(self, app_keys, header_only: bool = False):
+        raise NotImplementedError
+
+    def append_rows(self, app_key: str, rows):
+        raise NotImplementedError
+
+    def write_cells(self, app_key: str, cells):
+        raise NotImplementedError
+
+    def delete_rows(self, app_key: str, row_numbers):
+        raise NotImplementedError
+
+    def replace_tab(self, app_key: str, values):
+        raise NotImplementedError
+
+    def append_archive(self, app_key: str, headers, rows):
+        raise NotImplementedError
+
+    def load_archives(self, app_keys):
+        raise NotImplementedError
+
+    def add_column(self, app_key: str, name: str):
+        raise NotImplementedError
+
+    def reload(self):
+        pass
+
+
+# ==========================================================
+# SQLITE ENGINE
+# ==========================================================
+class SqliteBackend(StorageBackend):
+    """
+    Semua tab disimpan di satu file SQLite (bisa jalan full offline).
+    Baris disimpan utuh (JSON) per posisi, plus email (lowercase) dan expire_ts
+    (epoch, NULL kalau gak kebaca) yang di-index: cek email dan akun yang mau
+    expire cukup query SQL (find_emails / expiring_between), gak perlu load tab.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str, default_headers=None):
+        self.path = path
+        self.default_headers = list(default_headers or [])
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        fresh = self._db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'seeded'"
+        ).fetchone() is None
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS tabs ("
+            " app_key TEXT PRIMARY KEY,"
+            " headers_json TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS rows ("
+            " app_key TEXT NOT NULL,"
+            " pos INTEGER NOT NULL,"
+            " email TEXT NOT NULL DEFAULT '',"
+            " expire_ts REAL,"
+            " data_json TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS seeded (app_key TEXT PRIMARY KEY);"
+        )
+        # file lama: kolom index belum ada / masih versi teks -> tambah lalu isi ulang
+        have = {r[1] for r in self._db.execute("PRAGMA table_info(rows)")}
+        added = False
+        for c, ddl in (("email", "TEXT NOT NULL DEFAULT ''"), ("expire_ts", "REAL")):
+            if c not in have:
+                self._db.execute(f"ALTER TABLE rows ADD COLUMN {c} {ddl}")
+                added = True
+        self._db.executescript(
+            "CREATE INDEX IF NOT EXISTS rows_pos ON rows (app_key, pos);"
+            "CREATE INDEX IF NOT EXISTS rows_email ON rows (email);"
+            "CREATE INDEX IF NOT EXISTS rows_expire_ts ON rows (app_key, expire_ts);"
+            "DROP INDEX IF EXISTS rows_expire;"
+        )
+        if added:
+            self._reindex()
+        if fresh:
+            # file lama (sebelum ada penanda): tab yang udah ada isinya dianggap udah di-import
+            self._db.execute(
+                "INSERT OR IGNORE INTO seeded (app_key) SELECT DISTINCT app_key FROM rows"
+            )
+
+    # ---------- helper ----------
+    @contextmanager
+    def _tx(self):
+        self._db.execute("BEGIN")
+        try:
+            yield
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+
+    def headers(self, app_key: str):
+        """Header tab; tab yang belum ada -> default_headers (cuma baca, gak bikin tab)."""
+        with self._lock:
+            r = self._db.execute("SELECT headers_json FROM tabs WHERE app_key = ?", (app_key,)).fetchone()
+            return json.loads(r[0]) if r is not None else list(self.default_headers)
+
+    def _ensure_tab(self, app_key: str):
+        """Bikin tab pakai default_headers kalau belum ada. Cuma dipanggil dari jalur tulis."""
+        with self._lock:
+            self._db.execute(
+                "INSERT OR IGNORE INTO tabs (app_key, headers_json) VALUES (?, ?)",
+                (app_key, json.dumps(self.default_headers)),
+            )
+            return self.headers(app_key)
+
+    def is_seeded(self, app_key: str) -> bool:
+        """True kalau isi tab pernah ditimpa penuh (import dari sheet / replace_tab)."""
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM seeded WHERE app_key = ?", (app_key,)).fetchone() is not None
+
+    def has_tab(self, app_key: str) -> bool:
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM tabs WHERE app_key = ?", (app_key,)).fetchone() is not None
+
+    @staticmethod
+    def _keys(headers, row):
+        """(email lowercase, expire_ts atau None) buat kolom index."""
+        def get(name):
+            i = headers.index(name) if name in headers else None
+            return row[i] if i is not None and i < len(row) else ""
+        exp = expire_epoch(get("expire_datetime"))
+        return norm_email(get("email")), (exp if exp == exp else None)
+
+    def _reindex(self, app_key: str = None):
+        """Isi ulang kolom email / expire_ts dari data_json (migrasi / kolom baru)."""
+        with self._lock, self._tx():
+            keys = [app_key] if app_key else [k for (k,) in self._db.execute("SELECT app_key FROM tabs")]
+            for k in keys:
+                headers = self.headers(k)
+                cur = self._db.execute("SELECT rowid, data_json FROM rows WHERE app_key = ?", (k,))
+                params = [(*self._keys(headers, json.loads(d)), rid) for rid, d in cur.fetchall()]
+                self._db.executemany("UPDATE rows SET email = ?, expire_ts = ? WHERE rowid = ?", params)
+
+    @staticmethod
+    def _norm_row(row):
+        return ["" if x is None else str(x) for x in row]
+
+    # ---------- interface ----------
+    def load_tabs(self, app_keys, header_only: bool = False):
+        out = {}
+        with self._lock:
+            for k in app_keys:
+                values = [self.headers(k)]
+                if not header_only:
+                    cur = self._db.execute("SELECT data_json FROM rows WHERE app_key = ? ORDER BY pos", (k,))
+                    values.extend(json.loads(d) for (d,) in cur)
+                out[k] = values
+        return out
+
+    def append_rows(self, app_key: str, rows):
+        with self._lock:
+            headers = self._ensure_tab(app_key)
+            last = self._db.execute("SELECT MAX(pos) FROM rows WHERE app_key = ?", (app_key,)).fetchone()[0]
+            pos = (last or 1) + 1
+            params = []
+            for row in rows:
+                row = self._norm_row(row)
+                params.append((app_key, pos, *self._keys(headers, row), json.dumps(row, ensure_ascii=False)))
+                pos += 1
+            with self._tx():
+                self._db.executemany(
+                    "INSERT INTO rows (app_key, pos, email, expire_ts, data_json) VALUES (?, ?, ?, ?, ?)",
+                    params,
+                )
+
+    def write_cells(self, app_key: str, cells):
+        with self._lock:
+            headers = self.headers(app_key)
+            by_row = {}
+            for rn, ci, val in cells:
+                by_row.setdefault(rn, []).append((ci, val))
+            with self._tx():
+                for rn, changes in by_row.items():
+                    r = self._db.execute(
+                        "SELECT rowid, data_json FROM rows WHERE app_key = ? AND pos = ?", (app_key, rn)
+                    ).fetchone()
+                    if r is None:
+                        raise IndexError(f"Baris {rn} gak ada di tab {app_key}.")
+                    row = json.loads(r[1])
+                    for ci, val in changes:
+                        if ci >= len(row):
+                            row.extend([""] * (ci + 1 - len(row)))
+                        row[ci] = "" if val is None else str(val)
+                    self._db.execute(
+                        "UPDATE rows SET email = ?, expire_ts = ?, data_json = ? WHERE rowid = ?",
+                        (*self._keys(headers, row), json.dumps(row, ensure_ascii=False), r[0]),
+                    )
+
+    def delete_rows(self, app_key: str, row_numbers):
+        with self._lock:
+            with self._tx():
+                # dari bawah biar nomor range di atasnya gak geser
+                for start, end in reversed(row_ranges(row_numbers)):
+                    self._db.execute(
+                        "DELETE FROM rows WHERE app_key = ? AND pos BETWEEN ? AND ?", (app_key, start, end)
+                    )
+                    self._db.execute(
+                        "UPDATE rows SET pos = pos - ? WHERE app_key = ? AND pos > ?",
+                        (end - start + 1, app_key, end),
+                    )
+
+    def add_column(self, app_key: str, name: str):
+        with self._lock:
+            headers = self._ensure_tab(app_key)
+            if name not in headers:
+                self._db.execute(
+                    "UPDATE tabs SET headers_json = ? WHERE app_key = ?", (json.dumps(headers + [name]), app_key)
+                )
+                if name in ("email", "expire_datetime"):
+                    self._reindex(app_key)
+
+    # ---------- arsip (tab terpisah di file yang sama) ----------
+    def append_archive(self, app_key: str, headers, rows):
+        key = archive_key(app_key)
+        with self._lock:
+            if self.has_tab(key):
+                have = self.headers(key)
+                extra = [h for h in headers if h not in have]
+                if extra:
+                    have = have + extra
+                    self._db.execute(
+                        "UPDATE tabs SET headers_json = ? WHERE app_key = ?", (json.dumps(have), key)
+                    )
+            else:
+                have = list(headers)
+                self._db.execute(
+                    "INSERT INTO tabs (app_key, headers_json) VALUES (?, ?)", (key, json.dumps(have))
+                )
+            self.append_rows(key, fit_rows(have, headers, rows))
+
+    def load_archives(self, app_keys):
+        out = {}
+        for k in app_keys:
+            key = archive_key(k)
+            out[k] = self.load_tabs([key])[key] if self.has_tab(key) else []
+        return out
+
+    # ---------- query ber-index ----------
+    def find_emails(self, emails, app_keys):
+        """{email lowercase: [(app_key, row_number, row)]} buat email yang ada di tab-tab ini."""
+        emails = sorted({norm_email(e) for e in emails if norm_email(e)})
+        app_keys = set(app_keys)
+        out = {}
+        with self._lock:
+            # filter app_key di Python biar planner tetap pakai index email;
+            # batas parameter SQLite (default 999) -> per potongan
+            for i in range(0, len(emails), 500):
+                part = emails[i:i + 500]
+                cur = self._db.execute(
+                    f"SELECT email, app_key, pos, data_json FROM rows"
+                    f" WHERE email IN ({','.join('?' * len(part))}) ORDER BY pos",
+                    part,
+                )
+                for em, k, pos, d in cur:
+                    if k in app_keys:
+                        out.setdefault(em, []).append((k, pos, json.loads(d)))
+        return out
+
+    def expiring_between(self, app_key: str, start: float, end: float):
+        """[(row_number, row)] dengan start <= expire_ts < end, urut expire (epoch, sama kayak cache)."""
+        with self._lock:
+            cur = self._db.execute(
+                "SELECT pos, data_json FROM rows"
+                " WHERE app_key = ? AND expire_ts >= ? AND expire_ts < ? ORDER BY expire_ts, pos",
+                (app_key, start, end),
+            )
+            return [(pos, json.loads(d)) for pos, d in cur]
+
+    def replace_tab(self, app_key: str, values):
+        """Timpa satu tab penuh (header + data), dipakai buat import dari Google Sheet."""
+        values = values or [[]]
+        headers = [str(h).strip() for h in values[0]]
+        params = []
+        for pos, row in enumerate(values[1:], start=2):
+            row = self._norm_row(row)
+            params.append((app_key, pos, *self._keys(headers, row), json.dumps(row, ensure_ascii=False)))
+        with self._lock, self._tx():
+            self._db.execute(
+                "INSERT OR REPLACE INTO tabs (app_key, headers_json) VALUES (?, ?)",
+                (app_key, json.dumps(headers)),
+            )
+            self._db.execute("DELETE FROM rows WHERE app_key = ?", (app_key,))
+            self._db.executemany(
+                "INSERT INTO rows (app_key, pos, email, expire_ts, data_json) VALUES (?, ?, ?, ?, ?)",
+                params,
+            )
+            self._db.execute("INSERT OR IGNORE INTO seeded (app_key) VALUES (?)", (app_key,))
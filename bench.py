@@ -0,0 +1,232 @@
+"""
+Benchmark flow bot pakai fake Google Sheet (fake_sheets.py), tanpa nyentuh sheet produksi.
+
+Contoh:
+    python bench.py                       # 1k / 10k / 100k baris per tab
+    python bench.py --sizes 1000,10000 --latency 0.05 --error-rate 0.02
+
+Tiap flow dilaporkan: waktu, peak memory (tracemalloc), jumlah call API.
+Exit code 1 kalau ada flow yang error atau jumlah call-nya lewat BUDGETS
+(call yang kena 429 buatan lalu di-retry gak ikut dihitung ke budget).
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+_TMP = tempfile.mkdtemp(prefix="bench_")
+os.environ["STORAGE_BACKEND"] = "sheets"
+os.environ["JOURNAL_PATH"] = os.path.join(_TMP, "journal.db")
+os.environ["OWNER_FILE"] = os.path.join(_TMP, "owner.txt")
+os.environ.setdefault("CACHE_TTL", "3600")
+os.environ.setdefault("SHEETS_TIMEOUT", "600")
+
+import bot  # noqa: E402
+import fake_sheets  # noqa: E402
+from apps_config import APPS  # noqa: E402
+from storage import REQUIRED_HEADERS, ROW_ID  # noqa: E402
+
+# maksimal call API per flow (gak boleh naik sesuai jumlah baris)
+BUDGETS = {
+    "dashboard": 2,
+    "cek_email": 2,
+    "cek_email_warm": 0,
+    "reminder": 3 + len(APPS),
+    "add": 3,
+    # per tab: force load + delete di bawah lock tab itu doang
+    "dupes": 2 * len(APPS),
+}
+
+
+# ==========================================================
+# STUB TELEGRAM (cukup buat manggil handler)
+# ==========================================================
+class _Message:
+    def __init__(self, text=""):
+        self.text = text
+        self.replies = []
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+
+class _Chat:
+    id = 1
+
+
+class _Update:
+    def __init__(self, text=""):
+        self.message = _Message(text)
+        self.effective_chat = _Chat()
+        self.effective_user = _Chat()
+        self.callback_query = None
+
+
+class _Bot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append(text)
+
+
+class _Job:
+    def schedule_removal(self):
+        pass
+
+
+class _JobQueue:
+    def __init__(self):
+        self.pending = []
+
+    def run_once(self, callback, when=0, **kwargs):
+        # cuma job "sekarang" yang dijalanin bench (wakeup reminder dll diabaikan)
+        if not when:
+            self.pending.append(callback)
+        return _Job()
+
+
+class _Ctx:
+    def __init__(self):
+        self.user_data = {}
+        self.bot = _Bot()
+        self.job_queue = _JobQueue()
+        self.args = []
+
+    async def run_jobs(self):
+        while self.job_queue.pending:
+            await self.job_queue.pending.pop(0)(self)
+
+
+# ==========================================================
+# SEED DATA
+# ==========================================================
+def seed(sh, rows_per_tab: int, dup_ratio: float = 0.01):
+    now = datetime.now()
+    for app_key, v in APPS.items():
+        values = [list(REQUIRED_HEADERS) + [ROW_ID]]
+        for i in range(rows_per_tab):
+            exp = now + timedelta(days=(i % 120) - 60, hours=(i % 24))
+            values.append([
+                bot.fmt_dt(exp - timedelta(days=30)),
+                f"user{i}@{app_key}.test",
+                "30" if i % 5 else "1",
+                bot.fmt_dt(exp),
+                "ACTIVE",
+                f"0812{i:08d}",
+                "", "", "", "", "",
+                f"{app_key}-{i}",
+            ])
+        for i in range(int(rows_per_tab * dup_ratio)):
+            values.append(list(values[1 + (i * 7) % rows_per_tab]))
+        sh.add_worksheet(v["sheet"], values)
+
+
+# ==========================================================
+# RUNNER
+# ==========================================================
+async def _flow(name, sh, coro_fn, cold=True):
+    if cold:
+        bot.CACHE.invalidate()
+        bot.STATS.clear()
+    sh.reset_calls()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    error = ""
+    try:
+        await coro_fn()
+    except Exception as e:
+        error = f"{type(e).__name__}: {str(e)[:80]}"
+    wall = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    calls = sh.total_calls()
+    failed = sh.failed
+    return {
+        "flow": name,
+        "wall": wall,
+        "peak_mb": peak / 1e6,
+        "calls": calls,
+        "failed": failed,
+        "detail": dict(sh.calls),
+        "budget": BUDGETS[name],
+        "over": calls - failed > BUDGETS[name],
+        "error": error,
+    }
+
+
+async def run_size(rows: int, latency: float, error_rate: float):
+    sh = fake_sheets.FakeSpreadsheet(latency=latency, error_rate=error_rate)
+    seed(sh, rows)
+    fake_sheets.install(sh)
+    bot.REMINDERS.clear()
+    bot._LAST_SCAN = None
+    with open(bot.OWNER_FILE, "w") as f:
+        f.write("1")
+
+    ctx = _Ctx()
+    some_email = f"user{rows // 2}@canva.test"
+    results = []
+
+    results.append(await _flow("dashboard", sh, lambda: bot.dashboard(_Update(), ctx)))
+    results.append(await _flow("cek_email", sh, lambda: bot.check_email_step(_Update(some_email), ctx)))
+    results.append(await _flow("cek_email_warm", sh, lambda: bot.check_email_step(_Update(some_email), ctx), cold=False))
+    async def _reminder():
+        await bot.reminder_rescan_job(ctx)
+        await bot.reminder_job_all_apps(ctx)
+
+    results.append(await _flow("reminder", sh, _reminder))
+
+    async def _add():
+        ctx.user_data.update(add_app="canva", add_email="bench-new@canva.test", add_days=30)
+        await bot.add_phone(_Update("081234567890"), ctx)
+        await ctx.run_jobs()
+
+    results.append(await _flow("add", sh, _add))
+    results.append(await _flow("dupes", sh, lambda: bot.delete_duplicates_all(_Update(), ctx)))
+    return results
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", default="1000,10000,100000", help="jumlah baris per tab, pisah koma")
+    ap.add_argument("--latency", type=float, default=0.0, help="detik per call API (fake)")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="peluang 429 per call (fake)")
+    ap.add_argument("--out", default="", help="simpan laporan ke file juga")
+    args = ap.parse_args()
+
+    sizes = [int(x) for x in args.sizes.split(",") if x.strip()]
+
+    async def _all():
+        # satu event loop buat semua ukuran (semaphore SHEETS nempel ke loop)
+        return [(rows, await run_size(rows, args.latency, args.error_rate)) for rows in sizes]
+
+    lines = []
+    failed = False
+    for rows, results in asyncio.run(_all()):
+        lines.append(f"== {rows} baris x {len(APPS)} tab ==")
+        lines.append(f"{'flow':<16}{'wall(s)':>10}{'peak(MB)':>10}{'calls':>7}{'429':>5}{'budget':>8}  detail")
+        for r in results:
+            flag = "  OVER BUDGET" if r["over"] else ""
+            err = f"  ERROR {r['error']}" if r["error"] else ""
+            lines.append(
+                f"{r['flow']:<16}{r['wall']:>10.3f}{r['peak_mb']:>10.1f}{r['calls']:>7}{r['failed']:>5}{r['budget']:>8}"
+                f"  {r['detail']}{flag}{err}"
+            )
+            failed = failed or r["over"] or bool(r["error"])
+        lines.append("")
+
+    report = "\n".join(lines)
+    print(report)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(report + "\n")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
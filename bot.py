@@ -15,20 +15,71 @@ from telegram.ext import (
 )
 from datetime import datetime, timedelta
 import asyncio
+import csv
+import io
+import logging
 import os
-import json
-import tempfile
-import gspread
-from google.oauth2.service_account import Credentials
+import time
+
+from apps_config import APPS
+from dashboard_stats import STATS
+from export import copy_tabs, write_export
+from metrics import METRICS, serve as serve_metrics, timed
+from quota import BACKGROUND
+from reminders import MAX_LEAD, REMINDERS, due_actions, fields_deadline, next_deadline
+from sheet_cache import FLAG_BITS, STATUS_EXPIRED, norm_email, row_fields
+from storage import (
+    BACKEND,
+    CACHE,
+    CACHE_TTL,
+    JOURNAL,
+    JOURNAL_BATCH,
+    ROW_ID,
+    SCHEMA,
+    SHEETS,
+    delete_rows,
+    is_warm,
+    load_warm_snapshot,
+    new_row_id,
+    save_warm_snapshot,
+    tab_lock,
+    warmup,
+)
 
-from apps_config import APPS, BULANAN_MIN_DAYS
+log = logging.getLogger(__name__)
 
 # ==========================================================
 # CONFIG (Railway Variables)
 # ==========================================================
 BOT_TOKEN = os.environ.get("BOT_TOKEN", "").strip()
-SHEET_NAME = os.environ.get("SHEET_NAME", "Angel Studyneeds Sales")
 OWNER_FILE = os.environ.get("OWNER_FILE", "/tmp/owner_chat_id.txt")
+# interval retry flush journal akun baru ke sheet (detik)
+JOURNAL_FLUSH_INTERVAL = float(os.environ.get("JOURNAL_FLUSH_INTERVAL", "30"))
+# interval sync ulang tab sheet yang ketinggalan (mode mirror, detik)
+MIRROR_SYNC_INTERVAL = float(os.environ.get("MIRROR_SYNC_INTERVAL", "300"))
+# scan ulang semua tab buat antrian reminder (jaga-jaga edit manual di sheet, detik)
+REMINDER_RESCAN_INTERVAL = float(os.environ.get("REMINDER_RESCAN_INTERVAL", "21600"))
+# reminder yang gagal ditulis / owner belum di-set dicoba lagi setelah (detik)
+REMINDER_RETRY_DELAY = float(os.environ.get("REMINDER_RETRY_DELAY", "300"))
+# counter /list: geser bucket tiap (detik) + hitung ulang penuh dari sheet tiap (detik)
+DASHBOARD_TICK_INTERVAL = float(os.environ.get("DASHBOARD_TICK_INTERVAL", "60"))
+DASHBOARD_RECOUNT_INTERVAL = float(os.environ.get("DASHBOARD_RECOUNT_INTERVAL", "3600"))
+# simpan snapshot tab ke disk buat warm start tiap (detik)
+WARM_SNAPSHOT_INTERVAL = float(os.environ.get("WARM_SNAPSHOT_INTERVAL", "300"))
+# cek umur token Google tiap (detik); di-refresh kalau udah mau habis
+TOKEN_REFRESH_INTERVAL = float(os.environ.get("TOKEN_REFRESH_INTERVAL", "300"))
+# batas /bulkadd: jumlah baris + ukuran file CSV (byte)
+BULK_MAX_LINES = int(os.environ.get("BULK_MAX_LINES", "1000"))
+BULK_MAX_FILE = int(os.environ.get("BULK_MAX_FILE", str(1024 * 1024)))
+# batas jumlah email sekali /cekbulk
+CHECK_BULK_MAX = int(os.environ.get("CHECK_BULK_MAX", "50"))
+# interval pindahin akun EXPIRED lama ke tab arsip (detik)
+ARCHIVE_INTERVAL = float(os.environ.get("ARCHIVE_INTERVAL", "86400"))
+# interval isi row_id baris yang belum punya (tambahan manual); 0 = mati (kolom row_id gak dibuat otomatis)
+ROW_ID_INTERVAL = float(os.environ.get("ROW_ID_INTERVAL", "21600"))
+# endpoint Prometheus lokal (0 = mati)
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
 
 # ==========================================================
 # UI TEXT
@@ -117,10 +168,6 @@ def fmt_dt(dt: datetime) -> str:
     return dt.strftime("%Y-%m-%d %H:%M:%S")
 
 
-def parse_dt(s: str) -> datetime:
-    return datetime.strptime(s, "%Y-%m-%d %H:%M:%S")
-
-
 def human(td):
     s = int(td.total_seconds())
     if s <= 0:
@@ -135,10 +182,6 @@ def human(td):
     return f"{m} menit"
 
 
-def _flag(v):
-    return str(v).strip().lower() in ("1", "true", "yes", "sent", "done")
-
-
 def is_menu_add(t: str) -> bool:
     t = norm_text(t)
     return t.endswith("Tambah Akun") or t == "Tambah Akun"
@@ -170,45 +213,16 @@ def is_menu_help(t: str) -> bool:
 
 
 # ==========================================================
-# GOOGLE SHEET (cache biar gak authorize terus)
+# CACHE REFRESH JOB
 # ==========================================================
-_GC = None
-_SH = None
-
-
-def get_spreadsheet():
-    global _GC, _SH
-    if _SH is not None:
-        return _SH
-
-    if "GSHEET_CREDS_JSON" not in os.environ:
-        raise RuntimeError("ENV GSHEET_CREDS_JSON belum di-set di Railway.")
-
-    scopes = [
-        "https://www.googleapis.com/auth/spreadsheets",
-        "https://www.googleapis.com/auth/drive",
-    ]
-
-    data = json.loads(os.environ["GSHEET_CREDS_JSON"])
-    fd, path = tempfile.mkstemp(suffix=".json")
+async def cache_refresh_job(ctx: ContextTypes.DEFAULT_TYPE):
+    # refresh di background biar handler (cek email, list) langsung jawab dari memory.
+    # gak force: tab yang udah setengah ttl lewat delta sync (baca ekor doang),
+    # load penuh tetap jatah CACHE_FULL_RELOAD
     try:
-        with os.fdopen(fd, "w") as f:
-            json.dump(data, f)
-        creds = Credentials.from_service_account_file(path, scopes=scopes)
-        _GC = gspread.authorize(creds)
-        _SH = _GC.open(SHEET_NAME)
-        return _SH
-    finally:
-        try:
-            os.remove(path)
-        except Exception:
-            pass
-
-
-def ws_for_app(sh, app_key: str):
-    if app_key not in APPS:
-        raise ValueError("App tidak dikenali.")
-    return sh.worksheet(APPS[app_key]["sheet"])
+        await SHEETS.snapshots(APPS.keys(), max_age=CACHE_TTL / 2, priority=BACKGROUND)
+    except Exception:
+        pass
 
 
 # ==========================================================
@@ -231,6 +245,8 @@ def load_owner():
 # ==========================================================
 ADD_PICK_APP, ADD_EMAIL, ADD_DAYS, ADD_PHONE = range(4)
 CHECK_EMAIL = 10
+BULK_ADD = 20
+CHECK_BULK = 11
 
 
 # ==========================================================
@@ -251,7 +267,12 @@ async def help_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         "- ⚙️ Set Owner: set chat kamu sebagai penerima reminder\n\n"
         "Ketik /cancel untuk batal saat proses input.\n\n"
         "Command cepat:\n"
-        "/add, /cek, /list, /dupes, /owner",
+        "/add, /cek, /list, /dupes, /owner\n"
+        "/bulkadd = tambah banyak akun sekaligus (teks / file CSV)\n"
+        "/cekbulk = cek banyak email sekaligus\n"
+        "/export = download semua data (CSV gzip, owner)\n"
+        "/stats = statistik latency & call Google Sheet (owner)\n"
+        "/list force = hitung ulang dari sheet",
         reply_markup=main_menu_kb(),
     )
 
@@ -308,12 +329,50 @@ async def entry_check(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     return CHECK_EMAIL
 
 
+@timed("entry_check_bulk")
+async def entry_check_bulk(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
+    # reset biar gak nyangkut state lama
+    ctx.user_data.clear()
+    # /cekbulk langsung diikuti daftar email -> proses sekarang
+    parts = (update.message.text or "").split(None, 1)
+    text = parts[1] if len(parts) > 1 else ""
+    if text.strip():
+        return await check_bulk_text(update, ctx, text)
+
+    await update.message.reply_text(
+        "Kirim daftar email yang mau dicek (pisah baris / spasi / koma, "
+        f"maks {CHECK_BULK_MAX})\n/cancel untuk batal"
+    )
+    return CHECK_BULK
+
+
+@timed("entry_bulkadd")
+async def entry_bulkadd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
+    # reset biar gak nyangkut state lama
+    ctx.user_data.clear()
+    # /bulkadd langsung diikuti baris-baris data (boleh mulai di baris yang sama) -> proses sekarang
+    parts = (update.message.text or "").split(None, 1)
+    text = parts[1] if len(parts) > 1 else ""
+    if text.strip():
+        return await bulk_add_text(update, ctx, text)
+
+    ctx.user_data["bulk_add"] = True
+    await update.message.reply_text(
+        "Kirim daftar akun, satu akun per baris:\n"
+        f"{BULK_FORMAT}\n"
+        "contoh: canva,user@gmail.com,30,08123456789\n"
+        "atau upload file .csv dengan kolom yang sama.\n"
+        "/cancel untuk batal"
+    )
+    return BULK_ADD
+
+
 # ==========================================================
 # MENU NON-CONV (tombol lain)
 # ==========================================================
 async def handle_menu_other(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     # kalau lagi conversation add/check, jangan ganggu
-    if any(k in ctx.user_data for k in ("add_app", "add_email", "add_days")):
+    if any(k in ctx.user_data for k in ("add_app", "add_email", "add_days", "bulk_add")):
         return
 
     text = norm_text(update.message.text)
@@ -337,6 +396,33 @@ async def handle_menu_other(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
 # ==========================================================
 # ADD FLOW
 # ==========================================================
+def build_account_row(schema, email: str, days: int, phone: str, now: datetime):
+    """Baris akun baru sesuai urutan header tab."""
+    row_map = {
+        "created_datetime": fmt_dt(now),
+        "email": email,
+        "duration_days": days,
+        "expire_datetime": fmt_dt(now + timedelta(days=days)),
+        "status": "ACTIVE",
+        "customer_phone": phone,
+        "rem14_sent": "",
+        "rem7_sent": "",
+        "rem3_sent": "",
+        "rem1h_sent": "",
+        "rem1d_sent": "",
+        ROW_ID: new_row_id(),
+    }
+    return [row_map.get(h, "") for h in schema.headers]
+
+
+def track_new_account(ctx, app_key: str, schema, new_row):
+    """Akun baru langsung masuk counter /list + antrian reminder, gak nunggu hitung ulang."""
+    fields = row_fields(new_row, schema.cols)
+    STATS.add(app_key, new_row[schema.cols["expire_datetime"]])
+    REMINDERS.push(*fields_deadline(app_key, fields, schema.cols))
+    arm_reminders(ctx.job_queue)
+
+
 async def add_pick_app_cb(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     q = update.callback_query
     await q.answer()
@@ -405,6 +491,7 @@ async def add_days(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     return ADD_PHONE
 
 
+@timed("add_phone")
 async def add_phone(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     # Guard: pastikan state lengkap
     if not all(k in ctx.user_data for k in ("add_app", "add_email", "add_days")):
@@ -425,49 +512,30 @@ async def add_phone(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     now = datetime.now()
     exp = now + timedelta(days=days)
 
-    sh = get_spreadsheet()
-    ws = ws_for_app(sh, app_key)
-
-    headers = ws.row_values(1)
-    need = [
-        "created_datetime",
-        "email",
-        "duration_days",
-        "expire_datetime",
-        "status",
-        "customer_phone",
-        "rem14_sent",
-        "rem7_sent",
-        "rem3_sent",
-        "rem1h_sent",
-        "rem1d_sent",
-    ]
-    missing = [h for h in need if h not in headers]
-    if missing:
+    # header udah divalidasi waktu startup/refresh (SCHEMA), gak baca row 1 lagi
+    try:
+        schema = await SHEETS.schema(app_key)
+    except asyncio.TimeoutError:
+        await update.message.reply_text("⏳ Google Sheet lagi lambat (timeout). Coba lagi ya.", reply_markup=main_menu_kb())
+        ctx.user_data.clear()
+        return ConversationHandler.END
+
+    if schema.missing:
         await update.message.reply_text(
             "❌ Header sheet belum lengkap.\n"
-            f"Kurang kolom: {', '.join(missing)}\n"
+            f"Kurang kolom: {', '.join(schema.missing)}\n"
             "Samakan header row 1 sesuai kebutuhan bot.",
             reply_markup=main_menu_kb(),
         )
         ctx.user_data.clear()
         return ConversationHandler.END
 
-    row_map = {
-        "created_datetime": fmt_dt(now),
-        "email": email,
-        "duration_days": days,
-        "expire_datetime": fmt_dt(exp),
-        "status": "ACTIVE",
-        "customer_phone": phone,
-        "rem14_sent": "",
-        "rem7_sent": "",
-        "rem3_sent": "",
-        "rem1h_sent": "",
-        "rem1d_sent": "",
-    }
-    new_row = [row_map.get(h, "") for h in headers]
-    ws.append_row(new_row, value_input_option="USER_ENTERED")
+    new_row = build_account_row(schema, email, days, phone, now)
+
+    # tulis ke journal lokal dulu (langsung aman), masuk sheet-nya di background
+    JOURNAL.add(app_key, new_row)
+    ctx.job_queue.run_once(journal_flush_job, when=0)
+    track_new_account(ctx, app_key, schema, new_row)
 
     await update.message.reply_text(
         "✅ Akun tersimpan!\n"
@@ -484,73 +552,213 @@ async def add_phone(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
 
 
 # ==========================================================
-# DASHBOARD
+# BULK ADD (/bulkadd: teks banyak baris atau file CSV)
 # ==========================================================
-async def dashboard(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
-    await update.message.reply_text("⏳ Lagi ambil dashboard...")
+# format per baris: app,email,hari,wa (pemisah koma / titik koma / tab)
+BULK_FORMAT = "app,email,hari,wa"
 
-    def _work():
-        sh = get_spreadsheet()
-        now = datetime.now()
-        lines = ["📊 DASHBOARD\n"]
-        errors = []
 
-        for _, v in APPS.items():
-            try:
-                ws = sh.worksheet(v["sheet"])
-                rows = ws.get_all_records()
-
-                a = e = h3 = h7 = h14 = today = 0
-                for r in rows:
-                    try:
-                        exp = parse_dt(r["expire_datetime"])
-                        secs = (exp - now).total_seconds()
-                        if secs <= 0:
-                            e += 1
-                            continue
-                        a += 1
-                        d = secs / 86400
-                        if d <= 14:
-                            h14 += 1
-                        if d <= 7:
-                            h7 += 1
-                        if d <= 3:
-                            h3 += 1
-                        if d <= 0.01:
-                            today += 1
-                    except Exception:
-                        pass
-
-                lines.append(
-                    f"{v.get('icon','✨')} {v['title']}\n"
-                    f"Active: {a} | Expired: {e}\n"
-                    f"H14: {h14} | H7: {h7} | H3: {h3} | Today: {today}\n"
-                )
+def find_app(name: str):
+    """app_key dari key / judul / nama tab (gak peduli huruf besar-kecil)."""
+    n = norm_text(name).lower()
+    for k, v in APPS.items():
+        if n in (k.lower(), str(v.get("title", "")).lower(), str(v.get("sheet", "")).lower()):
+            return k
+    return None
 
-            except Exception as e:
-                errors.append(f"{v.get('title','?')}: {type(e).__name__} - {str(e)[:120]}")
-                continue
 
-        if errors:
-            lines.append("⚠️ Tab error (cek nama tab/akses):")
-            lines.extend([f"- {x}" for x in errors[:10]])
+def parse_bulk_lines(text: str):
+    """
+    Teks /bulkadd -> (items, errors).
+    items: list (no_baris, app_key, email, hari, wa); errors: list (no_baris, alasan).
+    Baris kosong & header (kolom kedua "email") di-skip.
+    """
+    lines = text.splitlines()
+    sample = next((ln for ln in lines if ln.strip()), "")
+    delim = "\t" if "\t" in sample else (";" if sample.count(";") > sample.count(",") else ",")
+
+    items, errors = [], []
+    seen = set()
+    for no, parts in enumerate(csv.reader(lines, delimiter=delim), start=1):
+        parts = [p.strip() for p in parts]
+        if not any(parts):
+            continue
+        if len(parts) > 1 and parts[1].lower() == "email":
+            continue
+        if len(parts) != 4:
+            errors.append((no, f"harus 4 kolom ({BULK_FORMAT})"))
+            continue
+
+        app_name, email, days_raw, phone_raw = parts
+        app_key = find_app(app_name)
+        email = email.lower()
+        if app_key is None:
+            errors.append((no, f"app '{app_name}' tidak dikenali"))
+        elif not is_valid_email(email):
+            errors.append((no, f"email '{email}' tidak valid"))
+        elif not days_raw.isdigit() or not 0 < int(days_raw) <= 3650:
+            errors.append((no, f"durasi '{days_raw}' tidak valid"))
+        elif not is_valid_phone(phone_raw):
+            errors.append((no, f"nomor '{phone_raw}' tidak valid"))
+        elif (app_key, email) in seen:
+            errors.append((no, f"email {email} dobel di {APPS[app_key]['title']}"))
+        else:
+            seen.add((app_key, email))
+            items.append((no, app_key, email, int(days_raw), normalize_wa(phone_raw)))
+    return items, errors
+
+
+async def bulk_add_text(update: Update, ctx: ContextTypes.DEFAULT_TYPE, text: str):
+    items, errors = parse_bulk_lines(text)
+    if len(items) + len(errors) > BULK_MAX_LINES:
+        await update.message.reply_text(
+            f"❌ Kebanyakan baris (maks {BULK_MAX_LINES}). Pecah jadi beberapa kali kirim ya.",
+            reply_markup=main_menu_kb(),
+        )
+        ctx.user_data.clear()
+        return ConversationHandler.END
 
-        return "\n".join(lines)
+    # header tiap tab dicek sekali (dari SCHEMA, gak baca sheet lagi)
+    schemas = {}
+    for app_key in {it[1] for it in items}:
+        try:
+            schemas[app_key] = await SHEETS.schema(app_key)
+        except Exception as e:
+            schemas[app_key] = e
 
+    now = datetime.now()
+    by_app = {}
+    for no, app_key, email, days, phone in items:
+        schema = schemas[app_key]
+        if isinstance(schema, Exception):
+            errors.append((no, f"tab {APPS[app_key]['title']} error: {type(schema).__name__}"))
+        elif schema.missing:
+            errors.append((no, f"header {APPS[app_key]['title']} kurang: {', '.join(schema.missing)}"))
+        else:
+            by_app.setdefault(app_key, []).append(build_account_row(schema, email, days, phone, now))
+
+    # semua baris masuk journal dalam satu transaksi, lalu flush = satu append_rows per tab
+    saved = JOURNAL.add_many((k, row) for k, rows in by_app.items() for row in rows)
+    for app_key, rows in by_app.items():
+        for row in rows:
+            track_new_account(ctx, app_key, schemas[app_key], row)
+
+    flushed = True
+    if saved:
+        try:
+            # batch selebar BULK_MAX_LINES: semua baris satu tab pasti masuk satu append
+            await SHEETS.flush_journal(batch_size=max(BULK_MAX_LINES, JOURNAL_BATCH), timeout=120)
+        except Exception:
+            log.exception("Flush journal /bulkadd gagal, dicoba lagi nanti")
+            flushed = False
+
+    lines = [f"📥 BULK ADD: {saved} akun tersimpan"]
+    for app_key, rows in by_app.items():
+        v = APPS[app_key]
+        lines.append(f"{v.get('icon','✨')} {v['title']}: {len(rows)}")
+    if saved and not flushed:
+        lines.append("⏳ Sheet lagi lambat, sisanya masuk otomatis di background.")
+    if errors:
+        errors.sort()
+        lines.append(f"\n⚠️ {len(errors)} baris gagal:")
+        lines.extend(f"- baris {no}: {why}" for no, why in errors[:20])
+        if len(errors) > 20:
+            lines.append(f"... dan {len(errors) - 20} lainnya")
+
+    await update.message.reply_text("\n".join(lines), reply_markup=main_menu_kb())
+    ctx.user_data.clear()
+    return ConversationHandler.END
+
+
+@timed("bulk_add_step")
+async def bulk_add_step(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
+    doc = update.message.document
+    if doc is None:
+        return await bulk_add_text(update, ctx, update.message.text or "")
+
+    if doc.file_size and doc.file_size > BULK_MAX_FILE:
+        await update.message.reply_text(f"❌ File kegedean (maks {BULK_MAX_FILE // 1024} KB).\n/cancel untuk batal")
+        return BULK_ADD
+    data = await (await doc.get_file()).download_as_bytearray()
     try:
-        text = await asyncio.wait_for(asyncio.to_thread(_work), timeout=60)
-    except asyncio.TimeoutError:
-        await update.message.reply_text(
-            "⏳ Dashboard terlalu lama (timeout). Biasanya ada tab bermasalah / sheet kebesaran."
+        text = bytes(data).decode("utf-8-sig")
+    except UnicodeDecodeError:
+        await update.message.reply_text("❌ File harus CSV teks (UTF-8).\n/cancel untuk batal")
+        return BULK_ADD
+    return await bulk_add_text(update, ctx, text)
+
+
+# ==========================================================
+# DASHBOARD
+# ==========================================================
+def recount_dashboard(app_keys, force: bool = False):
+    """Hitung ulang counter /list dari snapshot (force = download ulang dari sheet dulu)."""
+    snaps = CACHE.get_many(app_keys, force=force)
+    for app_key, snap in snaps.items():
+        if isinstance(snap, Exception):
+            STATS.fail(app_key, snap)
+        else:
+            STATS.recount(app_key, snap)
+
+
+def dashboard_text():
+    lines = ["📊 DASHBOARD\n"]
+    errors = []
+
+    for app_key, v in APPS.items():
+        c = STATS.get(app_key)
+        if isinstance(c, Exception):
+            errors.append(f"{v.get('title','?')}: {type(c).__name__} - {str(c)[:120]}")
+            continue
+        lines.append(
+            f"{v.get('icon','✨')} {v['title']}\n"
+            f"Active: {c['active']} | Expired: {c['expired']}\n"
+            f"H14: {c['h14']} | H7: {c['h7']} | H3: {c['h3']} | Today: {c['today']}\n"
         )
-        return
 
-    await update.message.reply_text(text, reply_markup=main_menu_kb())
+    if errors:
+        lines.append("⚠️ Tab error (cek nama tab/akses):")
+        lines.extend([f"- {x}" for x in errors[:10]])
+
+    return "\n".join(lines)
+
+
+@timed("dashboard")
+async def dashboard(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
+    # angka dari counter di memory; hitung ulang cuma kalau belum ada / diminta (/list force)
+    force = bool(ctx.args) and ctx.args[0].lower() in ("force", "ulang")
+    need = list(APPS) if force else [k for k in APPS if not STATS.ready(k)]
+
+    if need:
+        await update.message.reply_text("⏳ Lagi hitung ulang dashboard...")
+        try:
+            await SHEETS.run(recount_dashboard, need, force, timeout=60)
+        except asyncio.TimeoutError:
+            await update.message.reply_text(
+                "⏳ Dashboard terlalu lama (timeout). Biasanya ada tab bermasalah / sheet kebesaran."
+            )
+            return
+
+    await update.message.reply_text(dashboard_text(), reply_markup=main_menu_kb())
 
 
 # ==========================================================
 # CHECK EMAIL FLOW
 # ==========================================================
+def format_hit(h, now: float, archived: bool = False) -> str:
+    """Satu akun ketemu (EmailHit) -> blok teks hasil cek."""
+    v = APPS[h.app_key]
+    # expire udah epoch dari index (di-parse sekali waktu load)
+    sisa = human(timedelta(seconds=h.expire_ts - now)) if h.expire_ts == h.expire_ts else "?"
+    return (
+        f"{v.get('icon','✨')} {v['title']}{' 🗄 (arsip)' if archived else ''}\n"
+        f"Expire: {h.expire} ({sisa})\n"
+        f"Status: {h.status}\n"
+        f"HP: {mask_phone(h.phone)}\n"
+    )
+
+
+@timed("check_email_step")
 async def check_email_step(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     email = (update.message.text or "").strip()
     if not is_valid_email(email):
@@ -559,88 +767,231 @@ async def check_email_step(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
 
     await update.message.reply_text("🔎 Mengecek email di semua app...")
 
-    sh = get_spreadsheet()
-    now = datetime.now()
-    email_l = email.lower()
+    # lookup ke index email di cache (gak scan semua tab)
+    try:
+        hits, errs = await SHEETS.lookup_email(email, APPS.keys())
+    except asyncio.TimeoutError:
+        await update.message.reply_text("⏳ Cek email terlalu lama (timeout). Coba lagi ya.", reply_markup=main_menu_kb())
+        ctx.user_data.clear()
+        return ConversationHandler.END
+    now = time.time()
 
     lines = [f"🔎 HASIL CEK: {email}\n"]
-    found = False
-    errors = []
+    found = bool(hits)
+    errors = [
+        f"{APPS[k].get('title', k)}: {type(e).__name__} - {str(e)[:120]}"
+        for k, e in errs.items()
+    ]
 
-    for app_key, v in APPS.items():
+    for h in hits:
+        lines.append(format_hit(h, now))
+
+    if not found:
+        # fallback: akun lama yang udah dipindah ke arsip (download tab arsip, lebih lambat)
         try:
-            ws = sh.worksheet(v["sheet"])
-            values = ws.get_all_values()
-            if not values or len(values) < 2:
-                continue
+            archived, arch_errs = await SHEETS.archive_lookup([email], APPS.keys(), timeout=60)
+        except asyncio.TimeoutError:
+            archived, arch_errs = {email: []}, {}
+        for h in archived[email]:
+            lines.append(format_hit(h, now, archived=True))
+        if not archived[email]:
+            lines.append("❌ Tidak ketemu di semua app (termasuk arsip).")
+        errors.extend(
+            f"{APPS[k].get('title', k)} (arsip): {type(e).__name__} - {str(e)[:120]}"
+            for k, e in arch_errs.items()
+        )
 
-            headers = [h.strip() for h in values[0]]
-            if "email" not in headers:
-                continue
+    if errors:
+        lines.append("\n⚠️ Ada tab yang error (cek nama tab di Google Sheet):")
+        lines.extend([f"- {x}" for x in errors[:10]])
 
-            idx_email = headers.index("email")
-            idx_exp = headers.index("expire_datetime") if "expire_datetime" in headers else None
-            idx_status = headers.index("status") if "status" in headers else None
-            idx_phone = headers.index("customer_phone") if "customer_phone" in headers else None
+    await update.message.reply_text("\n".join(lines), reply_markup=main_menu_kb())
+    ctx.user_data.clear()
+    return ConversationHandler.END
 
-            for row in values[1:]:
-                row_email = (row[idx_email] if idx_email < len(row) else "").strip().lower()
-                if row_email != email_l:
-                    continue
 
-                found = True
-                exp_str = row[idx_exp] if (idx_exp is not None and idx_exp < len(row)) else "-"
-                status = row[idx_status] if (idx_status is not None and idx_status < len(row)) else "-"
-                phone = row[idx_phone] if (idx_phone is not None and idx_phone < len(row)) else ""
-
-                try:
-                    exp = parse_dt(exp_str)
-                    sisa = human(exp - now)
-                except Exception:
-                    sisa = "?"
-
-                lines.append(
-                    f"{v.get('icon','✨')} {v['title']}\n"
-                    f"Expire: {exp_str} ({sisa})\n"
-                    f"Status: {status}\n"
-                    f"HP: {mask_phone(phone)}\n"
-                )
+async def check_bulk_text(update: Update, ctx: ContextTypes.DEFAULT_TYPE, text: str):
+    # urutan input dipertahankan, email dobel cuma dicek sekali
+    emails = list(dict.fromkeys(e.lower() for e in text.replace(",", " ").replace(";", " ").split()))
+    invalid = [e for e in emails if not is_valid_email(e)]
+    emails = [e for e in emails if is_valid_email(e)]
 
-        except Exception as e:
-            errors.append(f"{v.get('title', app_key)}: {type(e).__name__} - {str(e)[:120]}")
-            continue
+    if not emails:
+        await update.message.reply_text("❌ Gak ada email valid. Coba lagi:\n/cancel untuk batal")
+        return CHECK_BULK
+    if len(emails) > CHECK_BULK_MAX:
+        await update.message.reply_text(f"❌ Kebanyakan email (maks {CHECK_BULK_MAX}). Coba lagi:\n/cancel untuk batal")
+        return CHECK_BULK
 
-    if not found:
-        lines.append("❌ Tidak ketemu di semua app.")
+    await update.message.reply_text(f"🔎 Mengecek {len(emails)} email di semua app...")
 
-    if errors:
-        lines.append("\n⚠️ Ada tab yang error (cek nama tab di Google Sheet):")
-        lines.extend([f"- {x}" for x in errors[:10]])
+    # semua tab di-load sekali, tiap email cuma lookup index
+    try:
+        results, errs = await SHEETS.lookup_emails(emails, APPS.keys())
+    except asyncio.TimeoutError:
+        await update.message.reply_text("⏳ Cek email terlalu lama (timeout). Coba lagi ya.", reply_markup=main_menu_kb())
+        ctx.user_data.clear()
+        return ConversationHandler.END
+    now = time.time()
 
-    await update.message.reply_text("\n".join(lines), reply_markup=main_menu_kb())
+    # yang gak ketemu di tab aktif dicari sekali di arsip
+    missing = [e for e in emails if not results[e]]
+    archived = {}
+    if missing:
+        try:
+            archived, arch_errs = await SHEETS.archive_lookup(missing, APPS.keys(), timeout=60)
+            errs = {**errs, **{k: e for k, e in arch_errs.items() if k not in errs}}
+        except asyncio.TimeoutError:
+            pass
+
+    found = sum(1 for e in emails if results[e] or archived.get(e))
+    blocks = [f"🔎 HASIL CEK BULK: {found}/{len(emails)} email ketemu\n"]
+    for email in emails:
+        hits = results[email]
+        if hits:
+            blocks.append(f"📧 {email}\n" + "".join(format_hit(h, now) for h in hits))
+        elif archived.get(email):
+            blocks.append(f"📧 {email}\n" + "".join(format_hit(h, now, archived=True) for h in archived[email]))
+        else:
+            blocks.append(f"📧 {email}\n❌ Tidak ketemu di semua app (termasuk arsip).\n")
+
+    if invalid:
+        blocks.append("⚠️ Email gak valid (di-skip): " + ", ".join(invalid[:20]))
+    if errs:
+        blocks.append(
+            "⚠️ Ada tab yang error (cek nama tab di Google Sheet):\n"
+            + "\n".join(f"- {APPS[k].get('title', k)}: {type(e).__name__} - {str(e)[:120]}" for k, e in list(errs.items())[:10])
+        )
+
+    # laporan panjang dipecah biar gak lewat batas 4096 karakter Telegram
+    chunk = ""
+    for b in blocks:
+        if chunk and len(chunk) + len(b) + 1 > 4000:
+            await update.message.reply_text(chunk)
+            chunk = ""
+        chunk += b + "\n"
+    await update.message.reply_text(chunk, reply_markup=main_menu_kb())
     ctx.user_data.clear()
     return ConversationHandler.END
 
 
+@timed("check_bulk_step")
+async def check_bulk_step(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
+    return await check_bulk_text(update, ctx, update.message.text or "")
+
+
+# ==========================================================
+# EXPORT (semua tab -> file .csv.gz, dikirim sebagai dokumen)
+# ==========================================================
+@timed("export_all")
+async def export_all(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
+    owner = load_owner()
+    if owner is None or update.effective_chat.id != owner:
+        await update.message.reply_text("⛔ /export cuma buat owner.", reply_markup=main_menu_kb())
+        return
+    await update.message.reply_text("📦 Menyiapkan export semua app...")
+
+    # semua tab lewat cache (kalau dingin: satu batch read)
+    try:
+        snaps = await SHEETS.snapshots(APPS.keys(), timeout=120)
+    except asyncio.TimeoutError:
+        await update.message.reply_text("⏳ Google Sheet lagi lambat (timeout). Coba lagi ya.", reply_markup=main_menu_kb())
+        return
+    errors = {k: e for k, e in snaps.items() if isinstance(e, Exception)}
+    # list baris disalin di dalam lock cache, biar write-through gak nabrak pas file ditulis
+    snaps = CACHE.dump(lambda tabs: copy_tabs(tabs, [k for k in snaps if k not in errors]))
+
+    # tulis file di thread pool, event loop gak ke-block
+    now = time.time()
+    path, total = await SHEETS.run(
+        write_export, snaps, now, lambda sec: human(timedelta(seconds=sec)), timeout=300
+    )
+    try:
+        caption = f"📦 Export {len(snaps)} app, {total} baris ({fmt_dt(datetime.now())})"
+        if errors:
+            caption += "\n⚠️ Gagal: " + ", ".join(APPS[k].get("title", k) for k in errors)
+        with open(path, "rb") as f:
+            await update.message.reply_document(
+                document=f,
+                filename=f"export_{datetime.now():%Y%m%d_%H%M}.csv.gz",
+                caption=caption,
+                reply_markup=main_menu_kb(),
+            )
+    finally:
+        os.unlink(path)
+
+
+# ==========================================================
+# STATS (owner only)
+# ==========================================================
+def _fmt_ms(v) -> str:
+    return f"{v * 1000:.0f}ms" if v < 10 else f"{v:.1f}s"
+
+
+def stats_text():
+    series, counters = METRICS.snapshot()
+    up = int(time.time() - METRICS.started)
+    lines = [f"📈 STATS (uptime {up // 86400} hari {up % 86400 // 3600} jam {up % 3600 // 60} menit)\n"]
+
+    for kind, title in (("handler", "Handler / job"), ("sheets", "Google Sheet per endpoint")):
+        rows = sorted((name, s) for (k, name), s in series.items() if k == kind)
+        if not rows:
+            continue
+        lines.append(f"{title} (n | p50 / p90 / p99 | error / timeout):")
+        for name, s in rows:
+            q = s["quantiles"]
+            pct = " / ".join(_fmt_ms(q[x]) for x in sorted(q)) if q else "-"
+            lines.append(f"- {name}: {s['count']} | {pct} | {s['errors']} / {s['timeouts']}")
+        lines.append("")
+
+    waits = {name: s for (k, name), s in series.items() if k == "quota_wait"}
+    if waits:
+        lines.append("Kuota (call | p90 nunggu token):")
+        for name, s in sorted(waits.items()):
+            p90 = s["quantiles"].get(0.9, 0.0)
+            lines.append(f"- {name}: {s['count']} | {_fmt_ms(p90)}")
+        lines.append("")
+
+    def _sum(name, **match):
+        return sum(
+            v for (n, labels), v in counters.items()
+            if n == name and all(dict(labels).get(k) == val for k, val in match.items())
+        )
+
+    lines.append(
+        f"Error API: {_sum('sheets_api_errors')} (429: {_sum('sheets_api_errors', status='429')}), "
+        f"retry: {_sum('sheets_retries')}, timeout: {_sum('sheets_timeouts')}"
+    )
+    lines.append(f"Journal antri: {JOURNAL.count()}")
+    return "\n".join(lines)
+
+
+async def stats_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
+    owner = load_owner()
+    if owner is None or update.effective_chat.id != owner:
+        await update.message.reply_text("⛔ /stats cuma buat owner.", reply_markup=main_menu_kb())
+        return
+    await update.message.reply_text(stats_text(), reply_markup=main_menu_kb())
+
+
 # ==========================================================
-# DELETE DUPLICATES (FIX: delete dari bawah biar row gak geser)
+# DELETE DUPLICATES (satu batch_update per tab, range dari bawah biar row gak geser)
 # ==========================================================
+@timed("delete_duplicates_all")
 async def delete_duplicates_all(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("🧹 Lagi hapus email dobel...")
 
-    def _work():
-        sh = get_spreadsheet()
-        total_deleted = 0
-        per_app = []
-
-        for _, v in APPS.items():
-            ws = sh.worksheet(v["sheet"])
-            rows = ws.get_all_records()
+    def _dedupe_tab(app_key):
+        # hapus pakai nomor baris -> wajib snapshot paling baru, dan gak boleh ada
+        # tulis lain (reminder / arsip / flush) di tab ini sampai selesai.
+        # lock satu tab aja, tab lain tetap bisa ditulis
+        with tab_lock(app_key):
+            snap = CACHE.get(app_key, force=True)
             seen = set()
             to_delete = []
 
-            for idx, r in enumerate(rows, start=2):  # start=2 karena row 1 header
-                em = str(r.get("email", "")).strip().lower()
+            # kolom email udah lowercase + interned
+            for idx, em in enumerate(snap.columns.email, start=2):  # start=2 karena row 1 header
                 if not em:
                     continue
                 if em in seen:
@@ -649,19 +1000,25 @@ async def delete_duplicates_all(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
                     seen.add(em)
 
             if to_delete:
-                # hapus dari bawah biar indeks aman
-                for rn in sorted(to_delete, reverse=True):
-                    ws.delete_rows(rn)
+                delete_rows(app_key, to_delete)
+        return len(to_delete)
 
-                per_app.append(f"{v['title']}: {len(to_delete)}")
-                total_deleted += len(to_delete)
+    def _work():
+        total_deleted = 0
+        per_app = []
+        for app_key, v in APPS.items():
+            n = _dedupe_tab(app_key)
+            if n:
+                recount_dashboard([app_key])
+                per_app.append(f"{v['title']}: {n}")
+                total_deleted += n
 
         if total_deleted == 0:
             return "✅ Tidak ada email dobel."
         return "🗑 Duplikat dihapus:\n" + "\n".join(per_app) + f"\n\nTotal: {total_deleted}"
 
     try:
-        result = await asyncio.wait_for(asyncio.to_thread(_work), timeout=120)
+        result = await SHEETS.run(_work, timeout=120)
     except asyncio.TimeoutError:
         await update.message.reply_text("⏳ Proses hapus dobel terlalu lama (timeout).")
         return
@@ -672,70 +1029,159 @@ async def delete_duplicates_all(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
 # ==========================================================
 # REMINDER JOB
 # ==========================================================
-async def reminder_job_all_apps(ctx: ContextTypes.DEFAULT_TYPE):
-    owner = load_owner()
-    if not owner:
+# satu wakeup run_once yang aktif: (job, waktu bangun epoch)
+_REMINDER_WAKEUP = None
+
+
+def arm_reminders(job_queue, at: float = None):
+    """Pasang run_once pas deadline paling awal di antrian (atau `at`), ganti wakeup lama kalau lebih telat."""
+    global _REMINDER_WAKEUP
+    when = at or REMINDERS.next_due()
+    if when is None:
         return
+    if _REMINDER_WAKEUP is not None:
+        job, old = _REMINDER_WAKEUP
+        if old <= when:
+            return
+        job.schedule_removal()
+    delay = max(0.0, when - time.time())
+    job = job_queue.run_once(reminder_job_all_apps, when=delay, name="reminder_wakeup")
+    _REMINDER_WAKEUP = (job, when)
 
-    sh = get_spreadsheet()
-    now = datetime.now()
 
-    for _, v in APPS.items():
+def _requeue(keys, when: float):
+    for key in keys:
+        REMINDERS.push(key, when)
+
+
+def _collect_tab(snap, keys, cols, now: float):
+    """
+    Satu tab, dijalanin di dalam lock cache (lewat CACHE.dump): nomor baris, row_id dan
+    kolom flag semua diambil dari snapshot yang sama, gak bisa ketuker sama hasil reload.
+    """
+    c = snap.columns
+    # index kecil cuma buat email yang jatuh tempo
+    want = {norm_email(email): [] for _, email, _ in keys}
+    for i, em in enumerate(c.email):
+        if em in want:
+            want[em].append(i)
+
+    msgs, cells, nexts, refs = [], [], [], {}
+    for key in keys:
+        _, email, exp = key
+        # akun udah dihapus / expire diganti -> entri dibuang (ketangkep lagi waktu rescan)
+        best = None
+        for i in want[norm_email(email)]:
+            if c.expire[i] != exp:
+                continue
+            row = snap.rows[i]
+            ref = str(snap.cell(row, ROW_ID)).strip() or i + 2
+            flags, status, duration = c.flags[i], c.status[i], c.duration[i]
+            reminders_due, expired = due_actions(flags, status, exp, duration, cols, now)
+            shown, phone = snap.cell(row, "email"), mask_phone(snap.cell(row, "customer_phone"))
+            for flag, label in reminders_due:
+                msgs.append((ref, f"{shown} | {label} | {phone}"))
+                cells.append((ref, cols[flag], "TRUE"))
+                flags |= FLAG_BITS[flag]
+            if expired:
+                cells.append((ref, cols["status"], "EXPIRED"))
+                status = STATUS_EXPIRED
+            if reminders_due or expired:
+                refs[ref] = key
+            nxt = next_deadline(flags, status, exp, duration, cols)
+            # deadline yang gak maju (kolom flag gak bisa ditulis) jangan diulang terus
+            if nxt is not None and nxt > now and (best is None or nxt < best):
+                best = nxt
+        if best is not None:
+            nexts.append((key, best))
+    return msgs, cells, nexts, refs
+
+
+def _collect_reminders(now: float, due):
+    """
+    Cari baris akun yang jatuh tempo (due = hasil REMINDERS.pop_due) di cache (kolom array,
+    gak bikin dict). Return {app_key: (msgs, cells, nexts, refs)}; nexts = [(key, deadline)] kalau
+    cells berhasil ditulis. Sel ditulis lewat row_id kalau barisnya punya (nomor baris dicari
+    ulang pas nulis), selain itu nomor baris snapshot. msgs = [(baris, teks)], refs = {baris: key}.
+    """
+    snaps = CACHE.get_many(list(due))
+    ready = {}
+    for app_key, keys in due.items():
         try:
-            ws = sh.worksheet(v["sheet"])
-            rows = ws.get_all_records()
-            headers = ws.row_values(1)
+            if isinstance(snaps[app_key], Exception):
+                raise snaps[app_key]
+            ready[app_key] = SCHEMA.get(app_key).cols
         except Exception:
-            continue
+            # tab lagi error -> coba lagi nanti
+            _requeue(keys, now + REMINDER_RETRY_DELAY)
 
-        msgs = []
+    def _scan(tabs):
+        # snapshot yang dipakai = yang aktif SEKARANG (bisa aja udah di-reload job lain)
+        return {
+            k: _collect_tab(tabs[k], due[k], cols, now) for k, cols in ready.items() if k in tabs
+        }
 
-        def set_flag(i_row: int, colname: str):
-            try:
-                if colname in headers:
-                    ws.update_cell(i_row, headers.index(colname) + 1, "TRUE")
-            except Exception:
-                pass
+    out = CACHE.dump(_scan)
+    for app_key in ready:
+        if app_key not in out:
+            # snapshot keburu dibuang (invalidate) -> ulang nanti
+            _requeue(due[app_key], now + REMINDER_RETRY_DELAY)
+    return out
 
-        def set_status_expired(i_row: int):
-            try:
-                if "status" in headers:
-                    ws.update_cell(i_row, headers.index("status") + 1, "EXPIRED")
-            except Exception:
-                pass
 
-        for i, r in enumerate(rows, start=2):
-            try:
-                exp = parse_dt(r["expire_datetime"])
-                secs = (exp - now).total_seconds()
+@timed("reminder_job_all_apps")
+async def reminder_job_all_apps(ctx: ContextTypes.DEFAULT_TYPE):
+    global _REMINDER_WAKEUP
+    _REMINDER_WAKEUP = None
+    now = time.time()
 
-                if secs <= 0:
-                    set_status_expired(i)
-                    continue
+    owner = load_owner()
+    if not owner:
+        arm_reminders(ctx.job_queue, now + REMINDER_RETRY_DELAY)
+        return
 
-                days_left = secs / 86400
-                dur = int(r.get("duration_days", 0) or 0)
-
-                if dur >= BULANAN_MIN_DAYS:
-                    if days_left <= 14 and not _flag(r.get("rem14_sent")):
-                        msgs.append(f"{r.get('email','')} | H-14 | {mask_phone(r.get('customer_phone',''))}")
-                        set_flag(i, "rem14_sent")
-                    if days_left <= 7 and not _flag(r.get("rem7_sent")):
-                        msgs.append(f"{r.get('email','')} | H-7 | {mask_phone(r.get('customer_phone',''))}")
-                        set_flag(i, "rem7_sent")
-                    if days_left <= 3 and not _flag(r.get("rem3_sent")):
-                        msgs.append(f"{r.get('email','')} | H-3 | {mask_phone(r.get('customer_phone',''))}")
-                        set_flag(i, "rem3_sent")
-                    if days_left <= 1 and not _flag(r.get("rem1d_sent")):
-                        msgs.append(f"{r.get('email','')} | H-1 | {mask_phone(r.get('customer_phone',''))}")
-                        set_flag(i, "rem1d_sent")
-                else:
-                    if secs / 3600 <= 1 and not _flag(r.get("rem1h_sent")):
-                        msgs.append(f"{r.get('email','')} | H-1 JAM | {mask_phone(r.get('customer_phone',''))}")
-                        set_flag(i, "rem1h_sent")
-            except Exception:
-                pass
+    # key yang udah di-pop wajib balik ke antrian kalau gagal di tengah jalan:
+    # rescan cuma mulai dari _LAST_SCAN, jadi gak bakal nemu mereka lagi
+    due = REMINDERS.pop_due(now)
+    if not due:
+        arm_reminders(ctx.job_queue)
+        return
+    try:
+        result = await SHEETS.run(_collect_reminders, now, due, timeout=120, priority=BACKGROUND)
+    except Exception:
+        log.exception("Reminder: gagal ambil data sheet")
+        for keys in due.values():
+            _requeue(keys, now + REMINDER_RETRY_DELAY)
+        arm_reminders(ctx.job_queue, now + REMINDER_RETRY_DELAY)
+        return
 
+    # semua tab ditulis sekali jalan: row_id di-resolve dari satu batch read, per tab satu batch_update
+    plan = {k: cells for k, (_, cells, _, _) in result.items() if cells}
+    try:
+        written = await SHEETS.write_cells_many(plan, timeout=120, priority=BACKGROUND) if plan else {}
+    except Exception as e:
+        written = dict.fromkeys(plan, e)
+
+    for app_key, (msgs, cells, nexts, refs) in result.items():
+        v = APPS[app_key]
+        lost = written.get(app_key, [])
+        if isinstance(lost, Exception):
+            # flag gak kesimpen -> jangan kirim, coba lagi nanti
+            log.error("Gagal update flag reminder tab %s (%d cell): %s", v["sheet"], len(cells), lost)
+            # semua key yang di-pop (termasuk yang gak punya deadline berikutnya)
+            _requeue(due[app_key], now + REMINDER_RETRY_DELAY)
+            continue
+
+        for key, when in nexts:
+            REMINDERS.push(key, when)
+        # nomor baris yang di-skip karena tab geser: barisnya masih ada, ulang pakai snapshot baru
+        for ref in lost:
+            if isinstance(ref, int) and ref in refs:
+                REMINDERS.push(refs[ref], now + REMINDER_RETRY_DELAY)
+
+        # baris yang keburu dihapus gak dikirim
+        lost = set(lost)
+        msgs = [text for ref, text in msgs if ref not in lost]
         if msgs:
             try:
                 await ctx.bot.send_message(
@@ -744,6 +1190,199 @@ async def reminder_job_all_apps(ctx: ContextTypes.DEFAULT_TYPE):
             except Exception:
                 pass
 
+    arm_reminders(ctx.job_queue)
+
+
+# waktu scan terakhir, epoch (None = belum pernah, scan pertama dari awal)
+_LAST_SCAN = None
+
+
+def _scan_deadlines():
+    """
+    Isi antrian dari data tab + journal yang belum ke-flush. Lewat index expire (bisect di
+    cache, atau query SQL ber-index di engine SQLite / mirror), cuma baris dengan expire di
+    [scan terakhir, sekarang + 14 hari + interval rescan] yang dicek; baris EXPIRED gak
+    pernah disentuh lagi.
+    """
+    global _LAST_SCAN
+    now = time.time()
+    start = _LAST_SCAN if _LAST_SCAN else float("-inf")
+    end = now + MAX_LEAD + REMINDER_RESCAN_INTERVAL
+    entries = []
+    complete = True
+    by_sql = getattr(BACKEND, "expiring_between", None)
+    if by_sql:
+        # langsung ke SQLite, gak perlu load tab ke cache
+        for app_key in APPS:
+            try:
+                cols = SCHEMA.get(app_key).cols
+                rows = by_sql(app_key, start, end)
+            except Exception:
+                complete = False
+                continue
+            for _, row in rows:
+                fields = row_fields(row, cols)
+                if fields[3] != STATUS_EXPIRED:
+                    entries.append(fields_deadline(app_key, fields, cols))
+    else:
+        for app_key, snap in CACHE.get_many(APPS.keys()).items():
+            if isinstance(snap, Exception):
+                complete = False
+                continue
+            cols = SCHEMA.get(app_key).cols
+            c = snap.columns
+            for exp, rn in snap.expiring_between(start, end):
+                i = rn - 2
+                if c.status[i] == STATUS_EXPIRED:
+                    continue
+                key = (app_key, c.email[i], exp)
+                entries.append((key, next_deadline(c.flags[i], c.status[i], exp, c.duration[i], cols)))
+    for _, app_key, row in JOURNAL.pending():
+        cols = SCHEMA.get(app_key).cols
+        entries.append(fields_deadline(app_key, row_fields(row, cols), cols))
+    REMINDERS.update(entries)
+    # ada tab gagal -> window berikutnya tetap mulai dari scan lama biar gak ada yang kelewat
+    if complete:
+        _LAST_SCAN = now
+    return len(entries)
+
+
+@timed("reminder_rescan_job")
+async def reminder_rescan_job(ctx: ContextTypes.DEFAULT_TYPE):
+    # antrian diisi dari data sheet (startup + jaga-jaga edit manual)
+    try:
+        await SHEETS.run(_scan_deadlines, timeout=120, priority=BACKGROUND)
+    except Exception:
+        log.exception("Reminder: gagal scan ulang deadline")
+        return
+    arm_reminders(ctx.job_queue)
+
+
+# ==========================================================
+# DASHBOARD COUNTER JOB
+# ==========================================================
+async def dashboard_tick_job(ctx: ContextTypes.DEFAULT_TYPE):
+    # geser akun yang udah nyebrang garis H14/H7/H3/Today/expired (cuma di memory)
+    STATS.tick()
+
+
+async def dashboard_recount_job(ctx: ContextTypes.DEFAULT_TYPE):
+    # rekonsiliasi berkala (edit manual di sheet, hapus baris, dll)
+    try:
+        await SHEETS.run(recount_dashboard, list(APPS), timeout=120, priority=BACKGROUND)
+    except Exception:
+        log.exception("Hitung ulang dashboard gagal")
+
+
+# ==========================================================
+# ARCHIVE JOB (akun EXPIRED lama -> tab arsip, tab aktif tetap kecil)
+# ==========================================================
+async def archive_job(ctx: ContextTypes.DEFAULT_TYPE):
+    for app_key in APPS:
+        try:
+            moved = await SHEETS.archive_expired(app_key, timeout=300)
+        except Exception:
+            log.exception("Arsip %s gagal, dicoba lagi nanti", app_key)
+            continue
+        if moved:
+            await SHEETS.run(recount_dashboard, [app_key], timeout=120, priority=BACKGROUND)
+
+
+# ==========================================================
+# ROW ID JOB (id stabil buat baris yang belum punya)
+# ==========================================================
+async def row_id_job(ctx: ContextTypes.DEFAULT_TYPE):
+    for app_key in APPS:
+        try:
+            added = await SHEETS.assign_row_ids(app_key, timeout=300)
+        except Exception:
+            log.exception("Isi row_id %s gagal, dicoba lagi nanti", app_key)
+            continue
+        if added:
+            log.info("row_id baru di %s: %d baris", app_key, added)
+
+
+# ==========================================================
+# JOURNAL FLUSH JOB (akun baru -> Google Sheet)
+# ==========================================================
+@timed("journal_flush_job")
+async def journal_flush_job(ctx: ContextTypes.DEFAULT_TYPE):
+    try:
+        await SHEETS.flush_journal(timeout=120)
+    except Exception:
+        log.exception("Flush journal gagal, dicoba lagi nanti")
+
+
+# ==========================================================
+# MIRROR SYNC JOB (mode STORAGE_BACKEND=mirror)
+# ==========================================================
+async def mirror_sync_job(ctx: ContextTypes.DEFAULT_TYPE):
+    # tab sheet yang ketinggalan (gagal mirror) ditimpa ulang dari SQLite
+    try:
+        await SHEETS.sync_mirror(timeout=300)
+    except Exception:
+        log.exception("Sync mirror sheet gagal, dicoba lagi nanti")
+
+
+# ==========================================================
+# WARM SNAPSHOT (restart langsung jawab dari disk)
+# ==========================================================
+async def warm_snapshot_job(ctx: ContextTypes.DEFAULT_TYPE):
+    try:
+        await SHEETS.save_snapshot(timeout=120)
+    except Exception:
+        log.exception("Simpan snapshot warm start gagal")
+
+
+async def on_shutdown(app: Application):
+    # snapshot terakhir sebelum proses mati (redeploy)
+    try:
+        save_warm_snapshot()
+    except Exception:
+        log.exception("Simpan snapshot waktu shutdown gagal")
+
+
+# ==========================================================
+# TOKEN GOOGLE (refresh duluan, request user gak nunggu renew)
+# ==========================================================
+async def token_refresh_job(ctx: ContextTypes.DEFAULT_TYPE):
+    try:
+        await SHEETS.refresh_credentials(timeout=60)
+    except Exception:
+        log.exception("Refresh token Google gagal, dicoba lagi nanti")
+
+
+# ==========================================================
+# SCHEMA CHECK (startup)
+# ==========================================================
+async def schema_check_job(ctx: ContextTypes.DEFAULT_TYPE):
+    # validasi header semua tab di awal, jangan nunggu ketahuan pas customer lagi input
+    try:
+        # metadata tab udah diambil waktu warmup; kalau warmup gagal, ambil di sini
+        if not is_warm():
+            await SHEETS.reload(timeout=120, priority=BACKGROUND)
+        await SHEETS.load_schema(timeout=60, priority=BACKGROUND)
+    except Exception:
+        log.exception("Gagal cek header sheet")
+        return
+
+    problems = SCHEMA.problems()
+    if not problems:
+        return
+
+    log.warning("Header sheet bermasalah: %s", "; ".join(problems))
+    owner = load_owner()
+    if owner:
+        try:
+            await ctx.bot.send_message(
+                owner,
+                "⚠️ Header sheet bermasalah:\n"
+                + "\n".join(f"- {x}" for x in problems)
+                + "\n\nSamakan header row 1 sesuai kebutuhan bot.",
+            )
+        except Exception:
+            pass
+
 
 # ==========================================================
 # MAIN
@@ -752,7 +1391,24 @@ def main():
     if not BOT_TOKEN:
         raise RuntimeError("BOT_TOKEN kosong. Set di Railway Variables.")
 
-    app = Application.builder().token(BOT_TOKEN).build()
+    app = Application.builder().token(BOT_TOKEN).post_shutdown(on_shutdown).build()
+
+    # warm start: data terakhir dari disk, /list & /cek langsung jawab;
+    # cache_refresh_job (first=1) yang narik data terbaru di background
+    load_warm_snapshot()
+
+    # warmup: authorize + buka sheet (by key) + metadata tab sebelum mulai polling
+    try:
+        warmup()
+    except Exception:
+        log.exception("Warmup Google Sheet gagal, lanjut (bakal connect pas dipakai)")
+
+    # endpoint Prometheus lokal (opsional)
+    if METRICS_PORT > 0:
+        try:
+            serve_metrics(METRICS_PORT, METRICS_HOST)
+        except OSError:
+            log.exception("Endpoint metrics gagal jalan di port %d", METRICS_PORT)
 
     # Commands
     app.add_handler(CommandHandler("start", start))
@@ -766,6 +1422,8 @@ def main():
     app.add_handler(CommandHandler("cek", entry_check))
     app.add_handler(CommandHandler("list", dashboard))
     app.add_handler(CommandHandler("dupes", delete_duplicates_all))
+    app.add_handler(CommandHandler("export", export_all))
+    app.add_handler(CommandHandler("stats", stats_cmd))
 
     # Conversation handler
     conv = ConversationHandler(
@@ -774,6 +1432,8 @@ def main():
             MessageHandler(filters.Regex(r".*(Cek Email)$"), entry_check),
             CommandHandler("add", entry_add),
             CommandHandler("cek", entry_check),
+            CommandHandler("bulkadd", entry_bulkadd),
+            CommandHandler("cekbulk", entry_check_bulk),
         ],
         states={
             ADD_PICK_APP: [CallbackQueryHandler(add_pick_app_cb)],
@@ -781,6 +1441,8 @@ def main():
             ADD_DAYS: [MessageHandler(filters.TEXT & ~filters.COMMAND, add_days)],
             ADD_PHONE: [MessageHandler(filters.TEXT & ~filters.COMMAND, add_phone)],
             CHECK_EMAIL: [MessageHandler(filters.TEXT & ~filters.COMMAND, check_email_step)],
+            CHECK_BULK: [MessageHandler(filters.TEXT & ~filters.COMMAND, check_bulk_step)],
+            BULK_ADD: [MessageHandler((filters.TEXT & ~filters.COMMAND) | filters.Document.ALL, bulk_add_step)],
             ConversationHandler.TIMEOUT: [MessageHandler(filters.ALL, conv_timeout)],
         },
         fallbacks=[
@@ -801,8 +1463,39 @@ def main():
     # group 1: menu umum
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_menu_other), group=1)
 
-    # reminder
-    app.job_queue.run_repeating(reminder_job_all_apps, interval=3600, first=10)
+    # cek header semua tab sekali di awal
+    app.job_queue.run_once(schema_check_job, when=0)
+
+    # journal akun baru: sisa antrian (restart) + retry berkala
+    app.job_queue.run_repeating(journal_flush_job, interval=JOURNAL_FLUSH_INTERVAL, first=5)
+
+    # mode mirror: SQLite data utama, sheet disamain berkala
+    if BACKEND.name == "mirror":
+        app.job_queue.run_repeating(mirror_sync_job, interval=MIRROR_SYNC_INTERVAL, first=60)
+
+    # reminder: antrian deadline dibangun di awal, job bangun pas deadline (run_once)
+    app.job_queue.run_repeating(reminder_rescan_job, interval=REMINDER_RESCAN_INTERVAL, first=10)
+
+    # counter /list: geser bucket berkala + hitung ulang penuh sesekali
+    app.job_queue.run_repeating(dashboard_tick_job, interval=DASHBOARD_TICK_INTERVAL, first=DASHBOARD_TICK_INTERVAL)
+    app.job_queue.run_repeating(dashboard_recount_job, interval=DASHBOARD_RECOUNT_INTERVAL, first=15)
+
+    # row_id buat baris lama / tambahan manual (kolom dibuat kalau belum ada)
+    if ROW_ID_INTERVAL > 0:
+        app.job_queue.run_repeating(row_id_job, interval=ROW_ID_INTERVAL, first=30)
+
+    # arsip akun EXPIRED lama (sekali sehari, mulai sejam setelah start)
+    app.job_queue.run_repeating(archive_job, interval=ARCHIVE_INTERVAL, first=3600)
+
+    # token Google di-refresh sebelum habis
+    app.job_queue.run_repeating(token_refresh_job, interval=TOKEN_REFRESH_INTERVAL, first=TOKEN_REFRESH_INTERVAL)
+
+    # snapshot disk berkala (plus sekali lagi waktu shutdown)
+    app.job_queue.run_repeating(warm_snapshot_job, interval=WARM_SNAPSHOT_INTERVAL, first=WARM_SNAPSHOT_INTERVAL)
+
+    # cache tab: load awal + refresh sebelum TTL habis
+    if CACHE_TTL > 0:
+        app.job_queue.run_repeating(cache_refresh_job, interval=max(CACHE_TTL * 0.8, 5), first=1)
 
     app.run_polling()
 
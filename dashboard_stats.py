@@ -0,0 +1,127 @@
+import threading
+import time
+from bisect import bisect_right, insort
+
+from sheet_cache import expire_epoch
+
+# garis bucket dashboard (detik dari sekarang); akun "nyebrang" garis pas expire <= now + offset
+LINES = {
+    "expired": 0,
+    "today": 0.01 * 86400,
+    "h3": 3 * 86400,
+    "h7": 7 * 86400,
+    "h14": 14 * 86400,
+}
+
+
+def bucket_of(exp: float, now: float) -> str:
+    """Bucket paling sempit satu akun (garis sama kayak counter /list); lewat H-14 = "active"."""
+    for name, off in LINES.items():
+        if exp <= now + off:
+            return name
+    return "active"
+
+
+# ==========================================================
+# COUNTER PER APP
+# ==========================================================
+class AppCounters:
+    """
+    Expire semua akun satu app (epoch, urut) + posisi tiap garis bucket.
+    _pos[line] = jumlah akun dengan expire <= now + offset; tick() cuma
+    majuin posisi buat akun yang baru nyebrang, jadi gak hitung ulang semua.
+    """
+
+    def __init__(self, exps, now: float):
+        self.exps = sorted(exps)
+        self.now = now
+        self._pos = {k: bisect_right(self.exps, now + off) for k, off in LINES.items()}
+
+    def tick(self, now: float):
+        if now <= self.now:
+            return
+        n = len(self.exps)
+        for k, off in LINES.items():
+            i, limit = self._pos[k], now + off
+            while i < n and self.exps[i] <= limit:
+                i += 1
+            self._pos[k] = i
+        self.now = now
+
+    def add(self, exp: float):
+        insort(self.exps, exp)
+        for k, off in LINES.items():
+            if exp <= self.now + off:
+                self._pos[k] += 1
+
+    def counts(self):
+        p = self._pos
+        return {
+            "active": len(self.exps) - p["expired"],
+            "expired": p["expired"],
+            "h14": p["h14"] - p["expired"],
+            "h7": p["h7"] - p["expired"],
+            "h3": p["h3"] - p["expired"],
+            "today": p["today"] - p["expired"],
+        }
+
+
+# ==========================================================
+# SEMUA APP
+# ==========================================================
+class DashboardStats:
+    """
+    Angka /list per app di memory. Dihitung penuh sekali (recount dari snapshot),
+    habis itu cuma di-update: add() tiap akun baru, tick() dari timer.
+    """
+
+    def __init__(self):
+        self._apps = {}
+        self._errors = {}
+        self._lock = threading.Lock()
+
+    def recount(self, app_key: str, snap, now: float = None):
+        now = time.time() if now is None else now
+        # expire udah epoch dari TabColumns, tinggal buang yang gak kebaca (nan)
+        counters = AppCounters([x for x in snap.columns.expire if x == x], now)
+        with self._lock:
+            self._apps[app_key] = counters
+            self._errors.pop(app_key, None)
+
+    def fail(self, app_key: str, error: Exception):
+        with self._lock:
+            self._apps.pop(app_key, None)
+            self._errors[app_key] = error
+
+    def add(self, app_key: str, expire: str):
+        exp = expire_epoch(expire)
+        with self._lock:
+            counters = self._apps.get(app_key)
+            if counters is not None and exp == exp:
+                counters.add(exp)
+
+    def tick(self, now: float = None):
+        now = time.time() if now is None else now
+        with self._lock:
+            for counters in self._apps.values():
+                counters.tick(now)
+
+    def clear(self):
+        with self._lock:
+            self._apps.clear()
+            self._errors.clear()
+
+    def ready(self, app_key: str) -> bool:
+        """Udah ada counter (tab yang terakhir error dianggap belum)."""
+        with self._lock:
+            return app_key in self._apps
+
+    def get(self, app_key: str):
+        """dict angka bucket, atau Exception kalau tab terakhir gagal ke-load."""
+        with self._lock:
+            if app_key in self._errors:
+                return self._errors[app_key]
+            return self._apps[app_key].counts()
+
+
+STATS = DashboardStats()
@@ -0,0 +1,87 @@
+import csv
+import gzip
+import os
+import tempfile
+
+from dashboard_stats import bucket_of
+
+# ==========================================================
+# EXPORT SEMUA TAB (/export -> file .csv.gz)
+# ==========================================================
+# Baris ditulis dari snapshot cache ke file gzip per chunk. Yang disalin
+# (di dalam lock cache, lewat copy_tabs) cuma list referensi baris + kolom
+# expire, bukan isi datanya. Kolom tambahan: sisa waktu (detik + teks)
+# dan bucket dashboard.
+
+CHUNK_ROWS = 2000
+EXTRA_HEADERS = ["sisa_detik", "sisa", "bucket"]
+
+
+class TabCopy:
+    """Pegangan snapshot buat export: list baris + expire disalin, baris-nya sendiri gak."""
+
+    def __init__(self, snap):
+        self.headers = list(snap.headers)
+        self.col = {h: snap.col(h) for h in self.headers}.get
+        self.rows = list(snap.rows)
+        self.expire = snap.columns.expire[:]
+
+
+def copy_tabs(snaps, app_keys):
+    """Dipanggil lewat CACHE.dump (di dalam lock): {app_key: TabCopy} buat tab yang ada."""
+    return {k: TabCopy(snaps[k]) for k in app_keys if k in snaps}
+
+
+def export_headers(snaps):
+    """Gabungan header semua tab (urutan kemunculan pertama)."""
+    seen = {}
+    for snap in snaps.values():
+        for h in snap.headers:
+            if h and h not in seen:
+                seen[h] = None
+    return list(seen)
+
+
+def _tab_rows(app_key, snap, headers, now, remaining):
+    idx = [snap.col(h) for h in headers]
+    expire = snap.expire
+    for i, row in enumerate(snap.rows):
+        n = len(row)
+        out = [app_key]
+        out.extend(row[j] if j is not None and j < n else "" for j in idx)
+        exp = expire[i]
+        if exp == exp:
+            left = int(exp - now)
+            out.extend((left, remaining(left), bucket_of(exp, now)))
+        else:
+            out.extend(("", "?", "?"))
+        yield out
+
+
+def write_export(snaps, now: float, remaining=str, directory: str = None):
+    """
+    {app_key: TabCopy} -> path file .csv.gz (temp, yang manggil wajib hapus).
+    remaining(detik) = teks sisa waktu (bot pakai human()).
+    Return (path, jumlah baris).
+    """
+    headers = export_headers(snaps)
+    fd, path = tempfile.mkstemp(prefix="export_", suffix=".csv.gz", dir=directory)
+    total = 0
+    try:
+        with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt", encoding="utf-8", newline="") as f:
+            w = csv.writer(f)
+            w.writerow(["app"] + headers + EXTRA_HEADERS)
+            for app_key, snap in snaps.items():
+                chunk = []
+                for out in _tab_rows(app_key, snap, headers, now, remaining):
+                    chunk.append(out)
+                    if len(chunk) >= CHUNK_ROWS:
+                        w.writerows(chunk)
+                        total += len(chunk)
+                        chunk = []
+                w.writerows(chunk)
+                total += len(chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path, total
@@ -0,0 +1,224 @@
+import random
+import re
+import threading
+import time
+from collections import Counter
+
+import gspread
+from gspread.utils import a1_to_rowcol
+
+# ==========================================================
+# FAKE GOOGLE SHEET (in-process, buat benchmark / coba offline)
+# ==========================================================
+# Niru permukaan gspread yang dipakai bot: Spreadsheet.worksheet/worksheets/
+# values_batch_get/batch_update + Worksheet.get_all_*/row_values/append_*/
+# update_cell/batch_update/delete_rows/update/batch_clear.
+# Tiap call dihitung per endpoint, bisa dikasih latency + error 429 buatan.
+
+
+class _FakeResponse:
+    def __init__(self, code: int, message: str):
+        self.status_code = code
+        self.text = message
+        self._body = {"error": {"code": code, "message": message, "status": "RESOURCE_EXHAUSTED"}}
+
+    def json(self):
+        return self._body
+
+
+def _rate_limit_error():
+    return gspread.exceptions.APIError(_FakeResponse(429, "Quota exceeded (fake)"))
+
+
+def _col_index(letters: str) -> int:
+    return a1_to_rowcol(letters + "1")[1]
+
+
+def _parse_range(rng: str):
+    """'A5:Z' / '1:1' / 'B3' -> (row1, col1, row2|None, col2|None), 1-based."""
+    m = re.match(r"^([A-Z]*)(\d*)(?::([A-Z]*)(\d*))?$", rng.strip().upper())
+    if not m:
+        raise ValueError(f"Range gak didukung: {rng}")
+    c1, r1, c2, r2 = m.groups()
+    row1 = int(r1) if r1 else 1
+    col1 = _col_index(c1) if c1 else 1
+    if m.group(0).find(":") < 0:
+        return row1, col1, row1, col1
+    row2 = int(r2) if r2 else None
+    col2 = _col_index(c2) if c2 else None
+    return row1, col1, row2, col2
+
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet, sheet_id: int, title: str, values=None):
+        self.spreadsheet = spreadsheet
+        self.id = sheet_id
+        self.title = title
+        self.values = [list(r) for r in (values or [])]
+        self.col_count = 26
+
+    @property
+    def row_count(self):
+        return max(len(self.values), 1000)
+
+    def _call(self, name: str):
+        self.spreadsheet._call(name)
+
+    # ---------- read ----------
+    def get_all_values(self):
+        self._call("get_all_values")
+        return [list(r) for r in self.values]
+
+    def get_all_records(self):
+        self._call("get_all_records")
+        if not self.values:
+            return []
+        hs = self.values[0]
+        return [{h: (r[i] if i < len(r) else "") for i, h in enumerate(hs)} for r in self.values[1:]]
+
+    def row_values(self, row: int):
+        self._call("row_values")
+        return list(self.values[row - 1]) if row <= len(self.values) else []
+
+    # ---------- write ----------
+    def _set(self, row: int, col: int, val):
+        while len(self.values) < row:
+            self.values.append([])
+        r = self.values[row - 1]
+        if len(r) < col:
+            r.extend([""] * (col - len(r)))
+        r[col - 1] = "" if val is None else str(val)
+
+    def append_row(self, values, value_input_option=None, **kwargs):
+        self._call("append_row")
+        self.values.append(["" if v is None else str(v) for v in values])
+
+    def append_rows(self, values, value_input_option=None, **kwargs):
+        self._call("append_rows")
+        self.values.extend(["" if v is None else str(v) for v in r] for r in values)
+
+    def update_cell(self, row: int, col: int, value):
+        self._call("update_cell")
+        self._set(row, col, value)
+
+    def update(self, values, range_name: str = "A1", **kwargs):
+        self._call("update")
+        row, col, _, _ = _parse_range(range_name)
+        for i, r in enumerate(values):
+            for j, v in enumerate(r):
+                self._set(row + i, col + j, v)
+
+    def batch_update(self, data, value_input_option=None, **kwargs):
+        self._call("values_batch_update")
+        for d in data:
+            row, col, _, _ = _parse_range(d["range"].split("!")[-1])
+            for i, r in enumerate(d["values"]):
+                for j, v in enumerate(r):
+                    self._set(row + i, col + j, v)
+
+    def batch_clear(self, ranges):
+        self._call("batch_clear")
+        for rng in ranges:
+            row1, col1, row2, col2 = _parse_range(rng.split("!")[-1])
+            for r in self.values[row1 - 1:row2]:
+                end = len(r) if col2 is None else min(col2, len(r))
+                for j in range(col1 - 1, end):
+                    r[j] = ""
+
+    def delete_rows(self, start_index: int, end_index: int = None):
+        self._call("delete_rows")
+        del self.values[start_index - 1:(end_index or start_index)]
+
+
+class FakeSpreadsheet:
+    """
+    latency    = detik tidur per call (niru round-trip ke Google)
+    error_rate = peluang tiap call gagal 429 (APIError beneran dari gspread)
+    """
+
+    def __init__(self, title: str = "fake", latency: float = 0.0, error_rate: float = 0.0, seed: int = 1):
+        self.id = "fake-spreadsheet"
+        self.title = title
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls = Counter()
+        self.failed = 0
+        self._tabs = {}
+        self._next_id = 1
+        self._rand = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _call(self, name: str):
+        with self._lock:
+            self.calls[name] += 1
+            fail = self.error_rate > 0 and self._rand.random() < self.error_rate
+            self.failed += fail
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            raise _rate_limit_error()
+
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    def reset_calls(self):
+        self.calls.clear()
+        self.failed = 0
+
+    # ---------- setup (gak dihitung sebagai call) ----------
+    def add_worksheet(self, title: str, values=None, rows=None, cols=None, **kwargs) -> FakeWorksheet:
+        # rows/cols = argumen gspread (ukuran grid), diabaikan di fake
+        ws = FakeWorksheet(self, self._next_id, title, values)
+        self._next_id += 1
+        self._tabs[title] = ws
+        return ws
+
+    def tab(self, title: str) -> FakeWorksheet:
+        return self._tabs[title]
+
+    # ---------- permukaan gspread ----------
+    def worksheet(self, title: str):
+        self._call("worksheet")
+        if title not in self._tabs:
+            raise gspread.exceptions.WorksheetNotFound(title)
+        return self._tabs[title]
+
+    def worksheets(self):
+        self._call("worksheets")
+        return list(self._tabs.values())
+
+    def values_batch_get(self, ranges, params=None):
+        self._call("values_batch_get")
+        out = []
+        for rng in ranges:
+            name, _, cells = rng.rpartition("!") if "!" in rng else (rng, "", "")
+            title = name[1:-1].replace("''", "'") if name.startswith("'") else name
+            if title not in self._tabs:
+                raise gspread.exceptions.WorksheetNotFound(title)
+            vals = self._tabs[title].values
+            if cells:
+                row1, col1, row2, col2 = _parse_range(cells)
+                vals = [r[col1 - 1:col2] for r in vals[row1 - 1:row2]]
+            out.append({"range": rng, "values": [list(r) for r in vals]})
+        return {"valueRanges": out}
+
+    def batch_update(self, body):
+        self._call("batch_update")
+        by_id = {ws.id: ws for ws in self._tabs.values()}
+        for req in body.get("requests", []):
+            if "deleteDimension" not in req:
+                raise NotImplementedError(f"Request fake gak didukung: {list(req)}")
+            rng = req["deleteDimension"]["range"]
+            ws = by_id[rng["sheetId"]]
+            del ws.values[rng["startIndex"]:rng["endIndex"]]
+        return {}
+
+
+def install(sh):
+    """Pasang fake ke storage (ganti koneksi Google Sheet), reset cache handle + snapshot."""
+    import storage
+
+    storage._SH = sh
+    storage.forget_worksheet()
+    storage.CACHE.invalidate()
+    return sh
@@ -0,0 +1,91 @@
+import json
+import sqlite3
+import threading
+import time
+
+
+# ==========================================================
+# JOURNAL AKUN BARU (SQLite WAL, write-behind ke Google Sheet)
+# ==========================================================
+class AccountJournal:
+    """
+    Antrian baris akun baru yang belum masuk Google Sheet.
+    Disimpan di disk dulu (durable), baru di-flush ke tab pakai append_rows.
+    Sisa antrian otomatis ke-flush lagi waktu bot restart.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pending ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " app_key TEXT NOT NULL,"
+            " row_json TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " last_error TEXT)"
+        )
+
+    def add(self, app_key: str, row) -> int:
+        with self._lock:
+            cur = self._db.execute(
+                "INSERT INTO pending (app_key, row_json, created_at) VALUES (?, ?, ?)",
+                (app_key, json.dumps(row, ensure_ascii=False), time.time()),
+            )
+            return cur.lastrowid
+
+    def add_many(self, items) -> int:
+        """items: iterable (app_key, row), satu transaksi. Return jumlah baris."""
+        now = time.time()
+        params = [(k, json.dumps(row, ensure_ascii=False), now) for k, row in items]
+        if not params:
+            return 0
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.executemany("INSERT INTO pending (app_key, row_json, created_at) VALUES (?, ?, ?)", params)
+            self._db.execute("COMMIT")
+        return len(params)
+
+    def pending(self, limit: int = None):
+        """List (id, app_key, row) urut dari yang paling lama."""
+        sql = "SELECT id, app_key, row_json FROM pending ORDER BY id"
+        args = ()
+        if limit:
+            sql += " LIMIT ?"
+            args = (limit,)
+        with self._lock:
+            rows = self._db.execute(sql, args).fetchall()
+        return [(i, k, json.loads(r)) for i, k, r in rows]
+
+    def done(self, ids):
+        ids = list(ids)
+        if not ids:
+            return
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.executemany("DELETE FROM pending WHERE id = ?", [(i,) for i in ids])
+            self._db.execute("COMMIT")
+
+    def failed(self, ids, error: str):
+        ids = list(ids)
+        if not ids:
+            return
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.executemany(
+                "UPDATE pending SET attempts = attempts + 1, last_error = ? WHERE id = ?",
+                [(error[:500], i) for i in ids],
+            )
+            self._db.execute("COMMIT")
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM pending").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
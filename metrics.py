@@ -0,0 +1,176 @@
+import asyncio
+import functools
+import logging
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+log = logging.getLogger(__name__)
+
+# jumlah sampel terakhir per metrik buat hitung persentil
+WINDOW = 1000
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+# ==========================================================
+# SERIES (satu nama: hitungan total + jendela durasi terakhir)
+# ==========================================================
+class Series:
+    def __init__(self, window: int = WINDOW):
+        self.count = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.total = 0.0
+        self.window = deque(maxlen=window)
+
+    def observe(self, seconds: float, error: Exception = None):
+        self.count += 1
+        self.total += seconds
+        self.window.append(seconds)
+        if isinstance(error, asyncio.TimeoutError):
+            self.timeouts += 1
+        elif error is not None:
+            self.errors += 1
+
+    def quantiles(self):
+        """{q: detik} dari jendela terakhir (nearest-rank); kosong kalau belum ada sampel."""
+        xs = sorted(self.window)
+        if not xs:
+            return {}
+        return {q: xs[min(len(xs) - 1, int(q * len(xs)))] for q in QUANTILES}
+
+
+# ==========================================================
+# REGISTRY
+# ==========================================================
+class Metrics:
+    """
+    Semua angka di memory, per (jenis, nama):
+    - "handler": handler / job bot (lewat decorator timed)
+    - "sheets": tiap call gspread per endpoint (lewat QUOTA.call), termasuk percobaan yang di-retry
+    Plus counter bebas (status error API, timeout per fungsi).
+    """
+
+    def __init__(self, window: int = WINDOW):
+        self._window = window
+        self._series = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+        self.started = time.time()
+
+    def observe(self, kind: str, name: str, seconds: float, error: Exception = None):
+        with self._lock:
+            s = self._series.get((kind, name))
+            if s is None:
+                s = self._series[(kind, name)] = Series(self._window)
+            s.observe(seconds, error)
+
+    def inc(self, name: str, labels: tuple = (), n: int = 1):
+        """Counter bebas, labels = tuple (key, value)."""
+        with self._lock:
+            key = (name, labels)
+            self._counters[key] = self._counters.get(key, 0) + n
+
+    def snapshot(self):
+        """(series, counters) versi salinan: {(kind, name): dict}, {(name, labels): n}."""
+        with self._lock:
+            series = {
+                k: {
+                    "count": s.count,
+                    "errors": s.errors,
+                    "timeouts": s.timeouts,
+                    "total": s.total,
+                    "quantiles": s.quantiles(),
+                }
+                for k, s in self._series.items()
+            }
+            return series, dict(self._counters)
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+            self._counters.clear()
+            self.started = time.time()
+
+    # ---------- format Prometheus ----------
+    def prometheus(self) -> str:
+        series, counters = self.snapshot()
+        out = []
+        for kind in sorted({k for k, _ in series}):
+            metric = f"asnb_{kind}_seconds"
+            label = "handler" if kind == "handler" else "endpoint"
+            out.append(f"# TYPE {metric} summary")
+            for (k, name), s in sorted(series.items()):
+                if k != kind:
+                    continue
+                lb = f'{label}="{_esc(name)}"'
+                for q, v in s["quantiles"].items():
+                    out.append(f'{metric}{{{lb},quantile="{q}"}} {v:.6f}')
+                out.append(f"{metric}_sum{{{lb}}} {s['total']:.6f}")
+                out.append(f"{metric}_count{{{lb}}} {s['count']}")
+            for field in ("errors", "timeouts"):
+                out.append(f"# TYPE asnb_{kind}_{field}_total counter")
+                for (k, name), s in sorted(series.items()):
+                    if k == kind:
+                        out.append(f'asnb_{kind}_{field}_total{{{label}="{_esc(name)}"}} {s[field]}')
+        for name in sorted({n for n, _ in counters}):
+            out.append(f"# TYPE asnb_{name}_total counter")
+            for (n, labels), v in sorted(counters.items()):
+                if n == name:
+                    lb = ",".join(f'{k}="{_esc(val)}"' for k, val in labels)
+                    out.append(f"asnb_{name}_total{{{lb}}} {v}" if lb else f"asnb_{name}_total {v}")
+        out.append(f"asnb_uptime_seconds {time.time() - self.started:.0f}")
+        return "\n".join(out) + "\n"
+
+
+def _esc(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+METRICS = Metrics()
+
+
+def timed(name: str, kind: str = "handler"):
+    """Decorator handler / job async: durasi + error/timeout masuk METRICS."""
+    def deco(fn):
+        @functools.wraps(fn)
+        async def _wrap(*args, **kwargs):
+            t0 = time.perf_counter()
+            error = None
+            try:
+                return await fn(*args, **kwargs)
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                METRICS.observe(kind, name, time.perf_counter() - t0, error)
+        return _wrap
+    return deco
+
+
+# ==========================================================
+# ENDPOINT PROMETHEUS (opsional, HTTP lokal)
+# ==========================================================
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = METRICS.prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+def serve(port: int, host: str = "127.0.0.1"):
+    """Jalanin endpoint /metrics di thread daemon. Return server (buat shutdown)."""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    log.info("Endpoint metrics jalan di http://%s:%d/metrics", host, port)
+    return server
@@ -0,0 +1,138 @@
+import random
+import threading
+import time
+
+import gspread
+import requests
+
+from metrics import METRICS
+
+# prioritas call: handler user duluan, job background ngalah
+INTERACTIVE = 0
+BACKGROUND = 1
+
+# status yang aman diulang (quota / server Google lagi error)
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+_local = threading.local()
+
+
+def current_priority() -> int:
+    return getattr(_local, "priority", INTERACTIVE)
+
+
+def with_priority(priority: int, fn):
+    """Bungkus fn biar semua call Sheets di dalamnya (di thread worker) pakai prioritas ini."""
+    def _run(*args, **kwargs):
+        old = current_priority()
+        _local.priority = priority
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _local.priority = old
+    return _run
+
+
+def error_status(e: Exception):
+    """Status HTTP dari error gspread (None kalau bukan error API)."""
+    if isinstance(e, gspread.exceptions.APIError):
+        code = getattr(e, "code", None)
+        if isinstance(code, int) and code > 0:
+            return code
+        return getattr(getattr(e, "response", None), "status_code", None)
+    return None
+
+
+# ==========================================================
+# TOKEN BUCKET
+# ==========================================================
+class TokenBucket:
+    """
+    per_minute token, diisi rata tiap detik, maksimal `burst` numpuk.
+    Kalau ada call INTERACTIVE yang lagi nunggu, BACKGROUND gak dapet token dulu.
+    """
+
+    def __init__(self, per_minute: float, burst: int = None):
+        self.rate = per_minute / 60.0
+        self.capacity = float(burst or max(1, int(per_minute // 4)))
+        self._tokens = self.capacity
+        self._stamp = time.monotonic()
+        self._waiting_interactive = 0
+        self._cond = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def acquire(self, priority: int = INTERACTIVE):
+        with self._cond:
+            if priority == INTERACTIVE:
+                self._waiting_interactive += 1
+            try:
+                while True:
+                    self._refill()
+                    blocked = priority != INTERACTIVE and self._waiting_interactive > 0
+                    if self._tokens >= 1 and not blocked:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate if self._tokens < 1 else 0.05
+                    self._cond.wait(timeout=max(wait, 0.01))
+            finally:
+                if priority == INTERACTIVE:
+                    self._waiting_interactive -= 1
+                    self._cond.notify_all()
+
+
+# ==========================================================
+# SCHEDULER
+# ==========================================================
+class RequestScheduler:
+    """
+    Semua call gspread lewat sini:
+    - kuota read & write dipisah (token bucket masing-masing)
+    - 429/5xx diulang pakai exponential backoff + jitter
+    - call yang gak idempotent (append, delete) cuma diulang kalau 429
+      (request ditolak sebelum diproses, jadi aman)
+    - tiap percobaan dicatat di METRICS per endpoint (nama fungsi gspread)
+    """
+
+    def __init__(self, reads_per_min: float = 60, writes_per_min: float = 60,
+                 max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 16.0):
+        self.buckets = {"read": TokenBucket(reads_per_min), "write": TokenBucket(writes_per_min)}
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def _retryable(self, e: Exception, idempotent: bool) -> bool:
+        status = error_status(e)
+        if status == 429:
+            return True
+        if not idempotent:
+            return False
+        if status in RETRY_STATUS:
+            return True
+        return isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+    def call(self, kind: str, fn, *args, idempotent: bool = True, **kwargs):
+        bucket = self.buckets[kind]
+        endpoint = getattr(fn, "__name__", "call")
+        for attempt in range(self.max_retries + 1):
+            t0 = time.monotonic()
+            bucket.acquire(current_priority())
+            METRICS.observe("quota_wait", kind, time.monotonic() - t0)
+            t0 = time.monotonic()
+            try:
+                res = fn(*args, **kwargs)
+            except Exception as e:
+                METRICS.observe("sheets", endpoint, time.monotonic() - t0, e)
+                status = error_status(e) or type(e).__name__
+                METRICS.inc("sheets_api_errors", (("endpoint", endpoint), ("status", str(status))))
+                if attempt >= self.max_retries or not self._retryable(e, idempotent):
+                    raise
+                METRICS.inc("sheets_retries", (("endpoint", endpoint),))
+                delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+                time.sleep(random.uniform(delay / 2, delay))
+            else:
+                METRICS.observe("sheets", endpoint, time.monotonic() - t0)
+                return res
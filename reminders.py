@@ -0,0 +1,130 @@
+import heapq
+import threading
+
+from apps_config import BULANAN_MIN_DAYS, REM_DAYS_1, REM_DAYS_3, REM_DAYS_7, REM_DAYS_14, REM_HOURS_1
+from sheet_cache import FLAG_BITS, STATUS_EXPIRED
+
+# ==========================================================
+# ATURAN REMINDER (flag kolom, label pesan, detik sebelum expire)
+# ==========================================================
+MONTHLY_STEPS = [
+    ("rem14_sent", "H-14", REM_DAYS_14 * 86400),
+    ("rem7_sent", "H-7", REM_DAYS_7 * 86400),
+    ("rem3_sent", "H-3", REM_DAYS_3 * 86400),
+    ("rem1d_sent", "H-1", REM_DAYS_1 * 86400),
+]
+SHORT_STEPS = [
+    ("rem1h_sent", "H-1 JAM", REM_HOURS_1 * 3600),
+]
+# reminder paling awal sebelum expire (detik)
+MAX_LEAD = max(before for _, _, before in MONTHLY_STEPS + SHORT_STEPS)
+
+
+def steps_for(duration: int):
+    return MONTHLY_STEPS if duration >= BULANAN_MIN_DAYS else SHORT_STEPS
+
+
+def due_actions(flags: int, status: int, exp: float, duration: int, cols, now: float):
+    """
+    Yang harus dikerjain buat satu akun sekarang (semua waktu epoch, flags bit FLAG_BITS).
+    Return (list (flag, label) reminder yang jatuh tempo, expired: bool).
+    Kolom flag/status yang gak ada di tab di-skip.
+    """
+    if exp <= now:
+        return [], "status" in cols and status != STATUS_EXPIRED
+    due = [
+        (flag, label)
+        for flag, label, before in steps_for(duration)
+        if flag in cols and exp - before <= now and not flags & FLAG_BITS[flag]
+    ]
+    return due, False
+
+
+def next_deadline(flags: int, status: int, exp: float, duration: int, cols):
+    """Epoch paling awal akun ini butuh dicek lagi (reminder berikutnya / expire). None = udah beres."""
+    if status == STATUS_EXPIRED or exp != exp:
+        return None
+    times = [
+        exp - before
+        for flag, _, before in steps_for(duration)
+        if flag in cols and not flags & FLAG_BITS[flag]
+    ]
+    if "status" in cols:
+        times.append(exp)
+    return min(times) if times else None
+
+
+def fields_deadline(app_key: str, fields, cols):
+    """row_fields() satu baris -> (key, deadline). Key antrian: (app_key, email, expire_ts); nomor baris bisa geser."""
+    email, exp, flags, status, duration = fields
+    return (app_key, email, exp), next_deadline(flags, status, exp, duration, cols)
+
+
+# ==========================================================
+# ANTRIAN DEADLINE (min-heap)
+# ==========================================================
+class ReminderQueue:
+    """
+    Min-heap deadline berikutnya per akun. Job reminder cukup bangun pas
+    deadline paling awal, ambil yang jatuh tempo, lalu masukin deadline
+    selanjutnya. Entri lama (ke-replace / udah diambil) dibuang malas pas pop.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._due = {}  # key -> deadline yang berlaku
+        self._lock = threading.Lock()
+
+    def push(self, key, when: float):
+        if when is None:
+            return
+        with self._lock:
+            self._due[key] = when
+            heapq.heappush(self._heap, (when, key))
+
+    def update(self, entries):
+        """
+        Timpa deadline buat key yang disebut. entries: iterable (key, when);
+        when None = akun udah beres, dikeluarin dari antrian. Key lain gak disentuh.
+        """
+        with self._lock:
+            for key, when in entries:
+                if when is None:
+                    self._due.pop(key, None)
+                else:
+                    self._due[key] = when
+                    heapq.heappush(self._heap, (when, key))
+
+    def _drop_stale(self):
+        while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    def next_due(self):
+        with self._lock:
+            self._drop_stale()
+            return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: float):
+        """Ambil semua key yang deadline-nya <= now, dikelompokkan per app_key."""
+        out = {}
+        with self._lock:
+            while True:
+                self._drop_stale()
+                if not self._heap or self._heap[0][0] > now:
+                    break
+                _, key = heapq.heappop(self._heap)
+                del self._due[key]
+                out.setdefault(key[0], []).append(key)
+        return out
+
+    def clear(self):
+        with self._lock:
+            self._heap = []
+            self._due = {}
+
+    def __len__(self):
+        with self._lock:
+            return len(self._due)
+
+
+REMINDERS = ReminderQueue()
@@ -0,0 +1,607 @@
+import math
+import sys
+import threading
+import time
+import zlib
+from array import array
+from bisect import bisect_left, insort
+from collections import namedtuple
+from datetime import datetime
+
+
+# satu hasil cek email (row_number versi sheet, data mulai row 2); expire_ts = epoch (nan kalau gak kebaca)
+EmailHit = namedtuple("EmailHit", "app_key row_number expire status phone expire_ts")
+
+# kolom yang ikut disimpan di index email
+INDEX_COLS = ("email", "expire_datetime", "status", "customer_phone")
+
+EXPIRE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# flag reminder dipadatin jadi bit (satu byte per baris)
+FLAG_COLS = ("rem14_sent", "rem7_sent", "rem3_sent", "rem1d_sent", "rem1h_sent")
+FLAG_BITS = {c: 1 << i for i, c in enumerate(FLAG_COLS)}
+
+# status jadi enum kecil
+STATUS_OTHER, STATUS_ACTIVE, STATUS_EXPIRED = 0, 1, 2
+_STATUS_CODES = {"ACTIVE": STATUS_ACTIVE, "EXPIRED": STATUS_EXPIRED}
+
+# kolom yang ada versi array-nya di TabColumns
+COLUMN_COLS = ("email", "expire_datetime", "status", "duration_days") + FLAG_COLS
+
+# delta sync: jumlah baris terakhir yang dibaca ulang buat ngecek tab gak berubah di atasnya
+TAIL_CHECK_ROWS = 3
+
+
+def norm_email(e) -> str:
+    return str(e or "").strip().lower()
+
+
+def is_flag(v) -> bool:
+    return str(v).strip().lower() in ("1", "true", "yes", "sent", "done")
+
+
+def status_code(v) -> int:
+    return _STATUS_CODES.get(str(v or "").strip().upper(), STATUS_OTHER)
+
+
+def expire_epoch(s) -> float:
+    """expire_datetime (string sheet, waktu lokal) -> epoch detik, nan kalau gak kebaca."""
+    s = str(s or "").strip()
+    try:
+        if len(s) == 19 and s[4] == "-" and s[7] == "-" and s[13] == ":" and s[16] == ":":
+            # jalur cepat format tetap, gak lewat strptime
+            dt = datetime(int(s[0:4]), int(s[5:7]), int(s[8:10]), int(s[11:13]), int(s[14:16]), int(s[17:19]))
+        else:
+            dt = datetime.strptime(s, EXPIRE_FORMAT)
+        return dt.timestamp()
+    except (ValueError, OverflowError):
+        return math.nan
+
+
+def _to_int(v) -> int:
+    try:
+        return int(str(v).strip() or 0)
+    except ValueError:
+        return 0
+
+
+def row_fields(row, col):
+    """
+    Satu baris mentah -> (email, expire_ts, flags, status, duration_days).
+    col = {nama header: index kolom}.
+    """
+    def get(name):
+        i = col.get(name)
+        return row[i] if i is not None and i < len(row) else ""
+
+    flags = 0
+    for c, bit in FLAG_BITS.items():
+        if is_flag(get(c)):
+            flags |= bit
+    return (
+        sys.intern(norm_email(get("email"))),
+        expire_epoch(get("expire_datetime")),
+        flags,
+        status_code(get("status")),
+        _to_int(get("duration_days")),
+    )
+
+
+def tail_checksum(rows, width: int) -> int:
+    """Checksum beberapa baris (dipotong ke `width` kolom, sel kosong di ujung dibuang)."""
+    crc = 0
+    for row in rows:
+        cells = [str(x) for x in row[:width]]
+        while cells and cells[-1] == "":
+            cells.pop()
+        crc = zlib.crc32("\x1f".join(cells).encode("utf-8") + b"\x1e", crc)
+    return crc
+
+
+# ==========================================================
+# KOLOM BERTIPE PER TAB
+# ==========================================================
+class TabColumns:
+    """
+    Kolom yang sering dipakai dalam bentuk array (index 0 = row 2), di-parse
+    sekali waktu tab ke-load: email (interned, lowercase), expire (epoch),
+    flags (bit FLAG_BITS), status (STATUS_*), duration (hari).
+    """
+
+    def __init__(self, rows, col):
+        self._col = col
+        self.email = []
+        self.expire = array("d")
+        self.flags = array("B")
+        self.status = array("B")
+        self.duration = array("l")
+        for row in rows:
+            self.append(row)
+
+    @classmethod
+    def from_arrays(cls, rows, col, expire, flags, status, duration):
+        """Pakai array yang udah jadi (warm start dari disk), email diambil ulang dari rows tanpa parse tanggal."""
+        self = cls((), col)
+        i = col.get("email")
+        self.email = [
+            sys.intern(norm_email(r[i] if i is not None and i < len(r) else "")) for r in rows
+        ]
+        self.expire, self.flags, self.status, self.duration = expire, flags, status, duration
+        if not (len(self.email) == len(expire) == len(flags) == len(status) == len(duration)):
+            raise ValueError("Panjang kolom gak sama.")
+        return self
+
+    def __len__(self):
+        return len(self.email)
+
+    def append(self, row):
+        em, exp, flags, status, dur = row_fields(row, self._col)
+        self.email.append(em)
+        self.expire.append(exp)
+        self.flags.append(flags)
+        self.status.append(status)
+        self.duration.append(dur)
+
+    def set(self, i: int, row):
+        em, exp, flags, status, dur = row_fields(row, self._col)
+        self.email[i] = em
+        self.expire[i] = exp
+        self.flags[i] = flags
+        self.status[i] = status
+        self.duration[i] = dur
+
+    def delete(self, i: int):
+        del self.email[i]
+        del self.expire[i]
+        del self.flags[i]
+        del self.status[i]
+        del self.duration[i]
+
+
+# ==========================================================
+# SNAPSHOT PER TAB
+# ==========================================================
+class TabSnapshot:
+    """
+    Isi satu tab hasil get_all_values(): header (row 1) + baris data.
+    Baris data index 0 = row 2 di sheet. Baris mentah tetap disimpan
+    (buat tulis balik), kolom penting ada versi array-nya di `columns`.
+    """
+
+    def __init__(self, app_key: str, values, loaded_at: float = None, columns=None):
+        values = values or []
+        self.app_key = app_key
+        self.headers = [str(h).strip() for h in values[0]] if values else []
+        self.rows = [list(r) for r in values[1:]]
+        self.loaded_at = time.monotonic() if loaded_at is None else loaded_at
+        self.from_disk = False  # True = hasil warm start, isinya bisa ketinggalan dari sheet
+        self._expiry = None  # index expire, dibangun pas pertama dipakai
+
+        # kalau header dobel, pakai kolom pertama (sama kayak headers.index)
+        self._col = {}
+        for i, h in enumerate(self.headers):
+            if h and h not in self._col:
+                self._col[h] = i
+
+        if columns is None:
+            self.columns = TabColumns(self.rows, self._col)
+        else:
+            self.columns = TabColumns.from_arrays(self.rows, self._col, *columns)
+
+    def col(self, name: str):
+        return self._col.get(name)
+
+    def cell(self, row, name: str, default=""):
+        i = self._col.get(name)
+        if i is None or i >= len(row):
+            return default
+        return row[i]
+
+    def hit(self, row_number: int) -> EmailHit:
+        row = self.rows[row_number - 2]
+        return EmailHit(
+            self.app_key,
+            row_number,
+            self.cell(row, "expire_datetime", "-"),
+            self.cell(row, "status", "-"),
+            self.cell(row, "customer_phone", ""),
+            self.columns.expire[row_number - 2],
+        )
+
+    def expiry_index(self):
+        """List (expire_ts, row_number) urut expire. Baris EXPIRED / expire gak kebaca gak ikut."""
+        if self._expiry is None:
+            c = self.columns
+            idx = [
+                (exp, rn)
+                for rn, exp, st in zip(range(2, len(c) + 2), c.expire, c.status)
+                if st != STATUS_EXPIRED and exp == exp  # nan != nan
+            ]
+            idx.sort()
+            self._expiry = idx
+        return self._expiry
+
+    def expiring_between(self, start: float, end: float):
+        """(expire_ts, row_number) dengan start <= expire_ts < end (bisect)."""
+        idx = self.expiry_index()
+        return idx[bisect_left(idx, (start,)):bisect_left(idx, (end,))]
+
+
+# ==========================================================
+# CACHE SEMUA TAB (TTL + write-through)
+# ==========================================================
+class SheetCache:
+    """
+    Cache snapshot semua tab APPS, dipakai bareng satu proses.
+
+    loader(app_keys) -> {app_key: values (list of list) atau Exception}.
+    Tab yang umurnya >= ttl detik di-load ulang saat diminta.
+
+    Delta sync (kalau ada tail_loader({app_key: (row_awal, lebar)}) -> {app_key: values}):
+    refresh cuma baca TAIL_CHECK_ROWS baris terakhir yang udah dikenal + baris baru
+    di bawahnya. Kalau checksum baris lama itu beda (ada yang diedit / dihapus), atau
+    load penuh terakhir udah lewat full_every detik, tab di-load penuh.
+    Setelah bot nulis ke sheet, panggil apply_* biar cache ikut update
+    (gak perlu download ulang), atau invalidate() kalau ragu.
+
+    Sekalian pegang index email lintas app:
+    email -> {app_key: [EmailHit, ...]}, jadi cek email cukup lookup dict.
+    """
+
+    def __init__(self, loader, ttl: float = 60, tail_loader=None, full_every: float = 3600):
+        self._loader = loader
+        self._tail_loader = tail_loader
+        self.ttl = ttl
+        self.full_every = full_every
+        self._full_at = {}  # app_key -> monotonic load penuh terakhir
+        self._tabs = {}
+        self._emails = {}
+        self._indexed = {}  # app_key -> set email yang lagi ada di index
+        self._loading = {}  # app_key -> threading.Event, load yang lagi jalan (di luar lock)
+        self._errors = {}  # app_key -> Exception load terakhir (buat caller yang nunggu)
+        self._gen = {}  # app_key -> naik tiap snapshot diubah di luar load
+        self._epoch = 0  # naik tiap invalidate() semua tab
+        self._lock = threading.RLock()
+
+    # ---------- index email ----------
+    def _index_tab(self, snap: TabSnapshot):
+        self._unindex_tab(snap.app_key)
+        emails = set()
+        for rn, em in enumerate(snap.columns.email, start=2):
+            if not em:
+                continue
+            self._emails.setdefault(em, {}).setdefault(snap.app_key, []).append(snap.hit(rn))
+            emails.add(em)
+        self._indexed[snap.app_key] = emails
+
+    def _unindex_tab(self, app_key: str):
+        for em in self._indexed.pop(app_key, ()):
+            per_app = self._emails.get(em)
+            if per_app is None:
+                continue
+            per_app.pop(app_key, None)
+            if not per_app:
+                del self._emails[em]
+
+    def _unindex_row(self, app_key: str, email: str, row_number: int):
+        per_app = self._emails.get(email)
+        if not per_app or app_key not in per_app:
+            return
+        hits = [h for h in per_app[app_key] if h.row_number != row_number]
+        if hits:
+            per_app[app_key] = hits
+        else:
+            del per_app[app_key]
+            self._indexed.get(app_key, set()).discard(email)
+            if not per_app:
+                del self._emails[email]
+
+    def _index_row(self, snap: TabSnapshot, row_number: int):
+        em = snap.columns.email[row_number - 2]
+        if not em:
+            return
+        hits = self._emails.setdefault(em, {}).setdefault(snap.app_key, [])
+        hits.append(snap.hit(row_number))
+        hits.sort(key=lambda h: h.row_number)
+        self._indexed.setdefault(snap.app_key, set()).add(em)
+
+    def lookup_email(self, email: str, app_keys):
+        """
+        Return (hits, errors). hits = list EmailHit urut sesuai app_keys,
+        errors = {app_key: Exception} buat tab yang gagal ke-load.
+        """
+        app_keys = list(app_keys)
+        snaps = self.get_many(app_keys)
+        errors = {k: v for k, v in snaps.items() if isinstance(v, Exception)}
+        with self._lock:
+            per_app = self._emails.get(norm_email(email), {})
+            hits = []
+            for k in app_keys:
+                if k not in errors:
+                    hits.extend(per_app.get(k, ()))
+        return hits, errors
+
+    def rows_for_email(self, app_key: str, email: str):
+        """
+        [(row_number, salinan baris)] email ini di snapshot tab yang aktif sekarang.
+        Nomor + isi baris diambil di dalam lock, jadi pasti dari snapshot yang sama.
+        """
+        with self._lock:
+            snap = self._tabs.get(app_key)
+            if snap is None:
+                return []
+            hits = self._emails.get(norm_email(email), {}).get(app_key, ())
+            return [(h.row_number, list(snap.rows[h.row_number - 2])) for h in hits]
+
+    def lookup_emails(self, emails, app_keys):
+        """
+        Banyak email sekaligus: tab di-load sekali, tiap email cuma lookup index.
+        Return ({email: [EmailHit]}, errors); key email sesuai input.
+        """
+        app_keys = list(app_keys)
+        snaps = self.get_many(app_keys)
+        errors = {k: v for k, v in snaps.items() if isinstance(v, Exception)}
+        out = {}
+        with self._lock:
+            for email in emails:
+                per_app = self._emails.get(norm_email(email), {})
+                out[email] = [h for k in app_keys if k not in errors for h in per_app.get(k, ())]
+        return out, errors
+
+    def _is_stale(self, app_key: str, now: float, max_age: float = None) -> bool:
+        snap = self._tabs.get(app_key)
+        if snap is None or self.ttl <= 0:
+            return True
+        return (now - snap.loaded_at) >= (self.ttl if max_age is None else max_age)
+
+    def _delta_ok(self, app_key: str, now: float) -> bool:
+        full_at = self._full_at.get(app_key)
+        return (
+            self._tail_loader is not None
+            and app_key in self._tabs
+            and full_at is not None
+            and now - full_at < self.full_every
+        )
+
+    def _version(self, app_key: str):
+        return self._epoch, self._gen.get(app_key, 0)
+
+    def _touch(self, app_key: str):
+        """Snapshot diubah di luar load (write-through / invalidate): load yang lagi jalan jadi basi."""
+        self._gen[app_key] = self._gen.get(app_key, 0) + 1
+
+    def _refresh_tails(self, app_keys, now: float):
+        """
+        Delta sync tab yang udah ada snapshot-nya. Return tab yang harus di-load penuh.
+        Baca ekor di luar lock; ditempel ke snapshot cuma kalau selama itu gak ada write-through.
+        """
+        with self._lock:
+            snaps = {k: self._tabs[k] for k in app_keys if k in self._tabs}
+            versions = {k: self._version(k) for k in snaps}
+            starts = {}
+            for k, snap in snaps.items():
+                keep = min(TAIL_CHECK_ROWS, len(snap.rows))
+                starts[k] = (len(snap.rows) - keep + 2, max(len(snap.headers), 1))
+        full = [k for k in app_keys if k not in snaps]
+        if not starts:
+            return full
+        try:
+            tails = self._tail_loader(starts)
+        except Exception:
+            return list(app_keys)
+
+        with self._lock:
+            for k, snap in snaps.items():
+                values = tails.get(k)
+                start, width = starts[k]
+                keep = len(snap.rows) - start + 2
+                if (
+                    self._tabs.get(k) is not snap
+                    or self._version(k) != versions[k]
+                    or values is None
+                    or isinstance(values, Exception)
+                    or len(values) < keep
+                    or tail_checksum(values[:keep], width) != tail_checksum(snap.rows[len(snap.rows) - keep:], width)
+                ):
+                    full.append(k)
+                    continue
+                for row in values[keep:]:
+                    self._append_row(snap, row)
+                snap.loaded_at = now
+        return full
+
+    def _load(self, app_keys, force: bool, now: float):
+        """Load (delta / penuh) tab yang dipegang caller ini, network di luar lock. Return {app_key: Exception}."""
+        need = list(app_keys)
+        if not force:
+            with self._lock:
+                delta = [k for k in need if self._delta_ok(k, now)]
+            if delta:
+                redo = set(self._refresh_tails(delta, now))
+                need = [k for k in need if k not in delta or k in redo]
+        errors = {}
+        if not need:
+            return errors
+
+        with self._lock:
+            versions = {k: self._version(k) for k in need}
+        loaded = self._loader(need)
+        built = {}
+        for k in need:
+            res = loaded.get(k)
+            if res is None:
+                res = RuntimeError("Tab tidak ke-load.")
+            built[k] = res if isinstance(res, Exception) else TabSnapshot(k, res, loaded_at=now)
+
+        with self._lock:
+            for k, res in built.items():
+                if isinstance(res, Exception):
+                    errors[k] = self._errors[k] = res
+                    self._tabs.pop(k, None)
+                    self._unindex_tab(k)
+                    continue
+                self._errors.pop(k, None)
+                if self._version(k) != versions[k]:
+                    # ada write-through / invalidate selama load -> data ini bisa ketinggalan.
+                    # snapshot lama (udah kena write-through) dipakai kalau ada; dua-duanya tetap basi
+                    if k in self._tabs:
+                        self._tabs[k].loaded_at = float("-inf")
+                        continue
+                    res.loaded_at = float("-inf")
+                else:
+                    self._full_at[k] = now
+                self._tabs[k] = res
+                self._index_tab(res)
+        return errors
+
+    def get_many(self, app_keys, force: bool = False, max_age: float = None):
+        """
+        Return {app_key: TabSnapshot atau Exception} sesuai urutan app_keys.
+        force = load penuh; max_age = anggap basi lebih cepat dari ttl (refresh background
+        sebelum handler kena tab basi, tetap lewat delta sync).
+
+        Load jalan di luar lock (lookup tab lain / tab yang masih seger gak ikut nunggu).
+        Satu tab cuma di-load satu caller; yang lain nunggu hasilnya, kecuali tab-nya
+        udah punya snapshot dan gak force -> snapshot lama langsung dipakai.
+        """
+        app_keys = list(app_keys)
+        errors = {}
+        todo = list(dict.fromkeys(app_keys))
+        while todo:
+            mine, waits = [], []
+            with self._lock:
+                now = time.monotonic()
+                for k in todo:
+                    if not (force or self._is_stale(k, now, max_age)):
+                        continue
+                    ev = self._loading.get(k)
+                    if ev is None:
+                        self._loading[k] = threading.Event()
+                        mine.append(k)
+                    elif force or k not in self._tabs:
+                        waits.append((k, ev))
+            if mine:
+                try:
+                    errors.update(self._load(mine, force, now))
+                finally:
+                    with self._lock:
+                        for k in mine:
+                            self._loading.pop(k).set()
+            for _, ev in waits:
+                ev.wait()
+            # force: load punya orang lain bisa aja mulai sebelum kita dipanggil -> load sendiri
+            todo = [k for k, _ in waits] if force else []
+
+        with self._lock:
+            out = {}
+            for k in app_keys:
+                if k in errors:
+                    out[k] = errors[k]
+                elif k in self._tabs:
+                    out[k] = self._tabs[k]
+                else:
+                    out[k] = self._errors.get(k) or RuntimeError("Tab tidak ke-load.")
+            return out
+
+    def get(self, app_key: str, force: bool = False):
+        res = self.get_many([app_key], force=force)[app_key]
+        if isinstance(res, Exception):
+            raise res
+        return res
+
+    def peek(self, app_key: str):
+        """Snapshot yang lagi ada di cache (None kalau belum), tanpa load."""
+        with self._lock:
+            return self._tabs.get(app_key)
+
+    def preload(self, snaps):
+        """
+        Pasang snapshot dari luar (warm start) apa adanya: umurnya ikut loaded_at snapshot,
+        load penuh berikutnya tetap jalan (gak lewat delta). Index email ikut dibangun.
+        """
+        with self._lock:
+            for snap in snaps:
+                self._touch(snap.app_key)
+                self._tabs[snap.app_key] = snap
+                self._index_tab(snap)
+
+    def dump(self, fn):
+        """fn({app_key: TabSnapshot}) dijalanin di dalam lock, biar gak ketabrak write-through."""
+        with self._lock:
+            return fn(dict(self._tabs))
+
+    def invalidate(self, app_key: str = None):
+        with self._lock:
+            if app_key is None:
+                self._epoch += 1
+                self._tabs.clear()
+                self._emails.clear()
+                self._indexed.clear()
+                self._full_at.clear()
+            else:
+                self._touch(app_key)
+                self._tabs.pop(app_key, None)
+                self._full_at.pop(app_key, None)
+                self._unindex_tab(app_key)
+
+    # ---------- write-through ----------
+    def _append_row(self, snap: TabSnapshot, row):
+        snap.rows.append(["" if x is None else str(x) for x in row])
+        snap.columns.append(snap.rows[-1])
+        rn = len(snap.rows) + 1
+        self._index_row(snap, rn)
+        exp = snap.columns.expire[-1]
+        if snap._expiry is not None and exp == exp and snap.columns.status[-1] != STATUS_EXPIRED:
+            insort(snap._expiry, (exp, rn))
+
+    def apply_append(self, app_key: str, row):
+        with self._lock:
+            self._touch(app_key)
+            snap = self._tabs.get(app_key)
+            if snap is not None:
+                self._append_row(snap, row)
+
+    def apply_cells(self, app_key: str, cells):
+        """cells: iterable (row_number, col_index_0, value). row_number versi sheet (data mulai 2)."""
+        with self._lock:
+            self._touch(app_key)
+            snap = self._tabs.get(app_key)
+            if snap is None:
+                return
+            index_cols = {snap.col(c) for c in INDEX_COLS} - {None}
+            column_cols = {snap.col(c) for c in COLUMN_COLS} - {None}
+            i_exp = snap.col("expire_datetime")
+            for rn, ci, val in cells:
+                i = rn - 2
+                if i < 0 or i >= len(snap.rows):
+                    # nomor baris gak cocok sama snapshot -> mending load ulang
+                    self._tabs.pop(app_key, None)
+                    self._unindex_tab(app_key)
+                    return
+                row = snap.rows[i]
+                old_email = snap.columns.email[i]
+                if ci >= len(row):
+                    row.extend([""] * (ci + 1 - len(row)))
+                row[ci] = "" if val is None else str(val)
+                if ci in column_cols:
+                    snap.columns.set(i, row)
+                if ci in index_cols:
+                    self._unindex_row(app_key, old_email, rn)
+                    self._index_row(snap, rn)
+                if ci == i_exp:
+                    snap._expiry = None
+
+    def apply_delete(self, app_key: str, row_numbers):
+        with self._lock:
+            self._touch(app_key)
+            snap = self._tabs.get(app_key)
+            if snap is None:
+                return
+            for rn in sorted(set(row_numbers), reverse=True):
+                i = rn - 2
+                if 0 <= i < len(snap.rows):
+                    del snap.rows[i]
+                    snap.columns.delete(i)
+            # nomor baris di bawahnya geser semua -> index tab ini dibangun ulang
+            self._index_tab(snap)
+            snap._expiry = None
@@ -0,0 +1,1101 @@
+import asyncio
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timedelta, timezone
+
+import gspread
+from google.auth.transport.requests import Request
+from google.oauth2.service_account import Credentials
+from gspread.utils import rowcol_to_a1
+
+from apps_config import APPS
+from backends import SqliteBackend, StorageBackend, fit_rows, row_ranges
+from journal import AccountJournal
+from metrics import METRICS
+from quota import BACKGROUND, INTERACTIVE, RequestScheduler, with_priority
+from sheet_cache import STATUS_EXPIRED, EmailHit, SheetCache, TabSnapshot, expire_epoch, norm_email
+import warm_start
+
+log = logging.getLogger(__name__)
+
+# ==========================================================
+# CONFIG (Railway Variables)
+# ==========================================================
+SHEET_NAME = os.environ.get("SHEET_NAME", "Angel Studyneeds Sales")
+# ID spreadsheet (bagian /d/<key>/ di URL); kalau di-set, gak perlu cari nama lewat Drive
+SHEET_KEY = os.environ.get("SHEET_KEY", "").strip()
+# token Google di-refresh kalau sisa umurnya kurang dari ini (detik)
+TOKEN_REFRESH_MARGIN = float(os.environ.get("TOKEN_REFRESH_MARGIN", "600"))
+# umur snapshot tab (detik) sebelum di-download ulang dari Google Sheet
+CACHE_TTL = float(os.environ.get("CACHE_TTL", "60"))
+# refresh cache cuma narik baris baru di ujung tab; tetap load penuh tiap segini detik (0 = selalu penuh)
+CACHE_FULL_RELOAD = float(os.environ.get("CACHE_FULL_RELOAD", "3600"))
+# jumlah thread buat I/O Google Sheet + batas waktu default per call (detik)
+SHEETS_WORKERS = int(os.environ.get("SHEETS_WORKERS", "4"))
+SHEETS_TIMEOUT = float(os.environ.get("SHEETS_TIMEOUT", "30"))
+# journal akun baru (ditulis dulu ke disk, baru di-flush ke sheet)
+JOURNAL_PATH = os.environ.get("JOURNAL_PATH", "/tmp/accounts_journal.db")
+JOURNAL_BATCH = int(os.environ.get("JOURNAL_BATCH", "200"))
+# sheets = langsung Google Sheet, sqlite = full lokal/offline,
+# mirror = SQLite data utama + Google Sheet sebagai cermin
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "sheets")
+SQLITE_PATH = os.environ.get("SQLITE_PATH", "/tmp/accounts.db")
+# kuota Sheets API (default Google: 60 read + 60 write per menit per user)
+SHEETS_READS_PER_MIN = float(os.environ.get("SHEETS_READS_PER_MIN", "60"))
+SHEETS_WRITES_PER_MIN = float(os.environ.get("SHEETS_WRITES_PER_MIN", "60"))
+SHEETS_MAX_RETRIES = int(os.environ.get("SHEETS_MAX_RETRIES", "5"))
+# snapshot semua tab di disk buat warm start (kosong = mati); umur maksimal yang masih dipakai (detik)
+WARM_SNAPSHOT_PATH = os.environ.get("WARM_SNAPSHOT_PATH", "/tmp/sheet_snapshot.bin")
+WARM_SNAPSHOT_MAX_AGE = float(os.environ.get("WARM_SNAPSHOT_MAX_AGE", "86400"))
+# arsip: akun EXPIRED lebih lama dari ini (hari) dipindah ke tab arsip (0 = mati);
+# nama tab arsip = nama tab app + suffix; maksimal baris per app sekali jalan
+ARCHIVE_GRACE_DAYS = float(os.environ.get("ARCHIVE_GRACE_DAYS", "30"))
+ARCHIVE_SUFFIX = os.environ.get("ARCHIVE_SUFFIX", " (arsip)")
+ARCHIVE_BATCH = int(os.environ.get("ARCHIVE_BATCH", "500"))
+
+
+# ==========================================================
+# GOOGLE SHEET (cache biar gak authorize terus)
+# ==========================================================
+_CREDS = None
+_GC = None
+_SH = None
+_WARMED = False
+
+# semua call gspread lewat QUOTA.call("read"/"write", ...)
+QUOTA = RequestScheduler(
+    reads_per_min=SHEETS_READS_PER_MIN,
+    writes_per_min=SHEETS_WRITES_PER_MIN,
+    max_retries=SHEETS_MAX_RETRIES,
+)
+
+
+def get_spreadsheet():
+    global _CREDS, _GC, _SH
+    if _SH is not None:
+        return _SH
+
+    if "GSHEET_CREDS_JSON" not in os.environ:
+        raise RuntimeError("ENV GSHEET_CREDS_JSON belum di-set di Railway.")
+
+    scopes = [
+        "https://www.googleapis.com/auth/spreadsheets",
+        "https://www.googleapis.com/auth/drive",
+    ]
+
+    # langsung dari dict, gak lewat file sementara
+    data = json.loads(os.environ["GSHEET_CREDS_JSON"])
+    _CREDS = Credentials.from_service_account_info(data, scopes=scopes)
+    _GC = gspread.authorize(_CREDS)
+    if SHEET_KEY:
+        _SH = QUOTA.call("read", _GC.open_by_key, SHEET_KEY)
+    else:
+        # fallback: cari nama lewat Drive (lebih lambat)
+        _SH = QUOTA.call("read", _GC.open, SHEET_NAME)
+    return _SH
+
+
+def refresh_credentials(margin: float = TOKEN_REFRESH_MARGIN) -> bool:
+    """Refresh token Google sebelum expire, biar request user gak nunggu renew. Return True kalau di-refresh."""
+    creds = _CREDS
+    if creds is None:
+        return False
+    # expiry google-auth = UTC naive
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    if creds.valid and creds.expiry and creds.expiry - now > timedelta(seconds=margin):
+        return False
+    creds.refresh(Request())
+    return True
+
+
+def warmup():
+    """
+    Startup (sebelum polling): authorize, buka sheet, ambil metadata semua tab
+    (mode mirror sekalian import tab yang belum ada), token di-refresh duluan.
+    """
+    global _WARMED
+    BACKEND.reload()
+    refresh_credentials()
+    _WARMED = True
+
+
+def is_warm() -> bool:
+    return _WARMED
+
+
+# handle worksheet per app (id tab + ukuran grid ikut kesimpen di object-nya)
+_WS = {}
+_WS_LOCK = threading.Lock()
+
+
+def reload_worksheets(sh=None):
+    """Ambil metadata SEMUA tab dalam satu call (sh.worksheets()), isi ulang cache handle."""
+    sh = sh or get_spreadsheet()
+    by_title = {ws.title: ws for ws in QUOTA.call("read", sh.worksheets)}
+    with _WS_LOCK:
+        _WS.clear()
+        for k, v in APPS.items():
+            if v["sheet"] in by_title:
+                _WS[k] = by_title[v["sheet"]]
+    return dict(_WS)
+
+
+def forget_worksheet(app_key: str = None):
+    with _WS_LOCK:
+        if app_key is None:
+            _WS.clear()
+        else:
+            _WS.pop(app_key, None)
+
+
+def ws_for_app(sh, app_key: str, reload: bool = False):
+    if app_key not in APPS:
+        raise ValueError("App tidak dikenali.")
+    ws = None if reload else _WS.get(app_key)
+    if ws is not None:
+        return ws
+    if reload or not _WS:
+        # pertama kali: sekalian semua tab, satu call metadata
+        reload_worksheets(sh)
+        ws = _WS.get(app_key)
+        if ws is not None:
+            return ws
+    # nama tab gak ketemu -> biar gspread yang lempar WorksheetNotFound
+    ws = QUOTA.call("read", sh.worksheet, APPS[app_key]["sheet"])
+    with _WS_LOCK:
+        _WS[app_key] = ws
+    return ws
+
+
+def _is_missing_tab(e: Exception) -> bool:
+    if isinstance(e, gspread.exceptions.WorksheetNotFound):
+        return True
+    if isinstance(e, gspread.exceptions.APIError):
+        msg = str(e).lower()
+        return "unable to parse range" in msg or "no grid with id" in msg
+    return False
+
+
+def with_ws(app_key: str, fn):
+    """
+    fn(sh, ws) pakai handle yang di-cache. Kalau tab-nya ternyata udah
+    dihapus/di-rename (handle basi), reload metadata sekali lalu ulang.
+    """
+    sh = get_spreadsheet()
+    try:
+        return fn(sh, ws_for_app(sh, app_key))
+    except Exception as e:
+        if not _is_missing_tab(e):
+            raise
+        forget_worksheet(app_key)
+        return fn(sh, ws_for_app(sh, app_key, reload=True))
+
+
+def archive_title(app_key: str) -> str:
+    return APPS[app_key]["sheet"] + ARCHIVE_SUFFIX
+
+
+def tab_range(app_key: str, cells: str = "", archive: bool = False) -> str:
+    # nama tab sebagai range A1 (tanpa `cells` = semua isi tab), kutip biar aman buat spasi
+    title = archive_title(app_key) if archive else APPS[app_key]["sheet"]
+    name = "'" + title.replace("'", "''") + "'"
+    return f"{name}!{cells}" if cells else name
+
+
+def batch_get_tabs(app_keys, cells="", archive: bool = False):
+    """
+    Ambil range dari banyak tab dalam SATU values_batch_get. cells = range yang sama buat
+    semua tab, atau dict {app_key: cells}. archive=True -> tab arsip app-nya.
+    Return {app_key: values atau Exception}.
+    """
+    sh = get_spreadsheet()
+    app_keys = list(app_keys)
+    cells_for = cells if isinstance(cells, dict) else dict.fromkeys(app_keys, cells)
+    try:
+        res = QUOTA.call("read", sh.values_batch_get, [tab_range(k, cells_for[k], archive) for k in app_keys])
+    except Exception as e:
+        # 429 / 5xx / timeout (udah di-retry QUOTA) -> semua tab gagal, jangan digandain per tab
+        if len(app_keys) <= 1 or not _is_missing_tab(e):
+            return {k: e for k in app_keys}
+        # satu tab salah nama bikin seluruh batch gagal -> ulang per tab biar ketahuan tab mana
+        out = {}
+        for k in app_keys:
+            out.update(batch_get_tabs([k], cells_for, archive))
+        return out
+
+    ranges = res.get("valueRanges", [])
+    out = {}
+    for i, k in enumerate(app_keys):
+        if i < len(ranges):
+            out[k] = ranges[i].get("values", [])
+        else:
+            out[k] = RuntimeError("Range tab gak ada di respon batch.")
+    return out
+
+
+def batch_write_cells(ws, cells):
+    """
+    cells: list (row_number, col_index_0, value) -> satu request batch_update.
+    Nulis nilai ke sel yang sama aman diulang, jadi 429/5xx di-retry seluruh batch (lewat QUOTA).
+    """
+    if not cells:
+        return
+    data = [{"range": rowcol_to_a1(rn, ci + 1), "values": [[val]]} for rn, ci, val in cells]
+    QUOTA.call("write", ws.batch_update, data, value_input_option="USER_ENTERED")
+
+
+def delete_row_ranges(sh, ws, row_numbers):
+    """
+    Hapus banyak baris sekaligus: baris yang nempel digabung jadi range,
+    semua deleteDimension dikirim dalam satu batch_update.
+    Urutan dari bawah biar index range sebelumnya gak geser.
+    Cuma di-retry kalau 429 (ditolak sebelum diproses). Error lain gak: kalau request
+    pertama ternyata sukses, retry bakal hapus baris lain.
+    """
+    ranges = row_ranges(row_numbers)
+    if not ranges:
+        return
+    reqs = [
+        {
+            "deleteDimension": {
+                "range": {
+                    "sheetId": ws.id,
+                    "dimension": "ROWS",
+                    "startIndex": start - 1,
+                    "endIndex": end,
+                }
+            }
+        }
+        for start, end in reversed(ranges)
+    ]
+    QUOTA.call("write", sh.batch_update, {"requests": reqs}, idempotent=False)
+
+
+def overwrite_tab(app_key: str, values):
+    """Timpa isi tab dengan values (mode mirror). Sisa sel lama di luar values dikosongin."""
+    width = max([len(r) for r in values] + [1])
+    rows = [list(r) + [""] * (width - len(r)) for r in values]
+
+    def _do(sh, ws):
+        QUOTA.call("write", ws.update, rows, "A1", value_input_option="USER_ENTERED")
+        last_col = rowcol_to_a1(1, max(width, ws.col_count))[:-1]
+        clear = [f"A{len(rows) + 1}:{last_col}"]
+        if ws.col_count > width:
+            clear.append(f"{rowcol_to_a1(1, width + 1)[:-1]}1:{last_col}")
+        QUOTA.call("write", ws.batch_clear, clear)
+
+    with_ws(app_key, _do)
+
+
+# ==========================================================
+# BACKEND (tempat data akun: Google Sheet / SQLite / SQLite + mirror sheet)
+# ==========================================================
+class SheetsBackend(StorageBackend):
+    """Engine default: langsung ke Google Sheet lewat gspread."""
+
+    name = "sheets"
+
+    def load_tabs(self, app_keys, header_only: bool = False):
+        return batch_get_tabs(app_keys, "1:1" if header_only else "")
+
+    def load_tails(self, starts):
+        """starts: {app_key: (row_awal, lebar)} -> baris dari row_awal sampai bawah, satu batch read."""
+        cells = {
+            k: f"A{start}:{rowcol_to_a1(1, max(width, 1))[:-1]}"
+            for k, (start, width) in starts.items()
+        }
+        return batch_get_tabs(list(starts), cells)
+
+    def append_rows(self, app_key: str, rows):
+        # 5xx gak di-retry (bisa jadi udah masuk); journal yang ngulang + cek dobel
+        with_ws(app_key, lambda sh, ws: QUOTA.call(
+            "write", ws.append_rows, rows, value_input_option="USER_ENTERED", idempotent=False,
+        ))
+
+    def write_cells(self, app_key: str, cells):
+        with_ws(app_key, lambda sh, ws: batch_write_cells(ws, cells))
+
+    def delete_rows(self, app_key: str, row_numbers):
+        with_ws(app_key, lambda sh, ws: delete_row_ranges(sh, ws, row_numbers))
+
+    def replace_tab(self, app_key: str, values):
+        overwrite_tab(app_key, values)
+
+    def append_archive(self, app_key: str, headers, rows):
+        sh = get_spreadsheet()
+        title = archive_title(app_key)
+        try:
+            ws = QUOTA.call("read", sh.worksheet, title)
+            have = QUOTA.call("read", ws.row_values, 1)
+        except gspread.exceptions.WorksheetNotFound:
+            ws = QUOTA.call("write", sh.add_worksheet, title=title, rows=1, cols=len(headers), idempotent=False)
+            have = []
+        if not have:
+            out = [list(headers)] + [list(r) for r in rows]
+        else:
+            extra = [h for h in headers if h not in have]
+            if extra:
+                have = have + extra
+                QUOTA.call("write", ws.update, [have], "A1")
+            out = fit_rows(have, headers, rows)
+        QUOTA.call("write", ws.append_rows, out, value_input_option="USER_ENTERED", idempotent=False)
+
+    def load_column(self, cols):
+        """cols: {app_key: index kolom 0-based} -> isi kolom dari row 2 ke bawah, satu batch read."""
+        cells = {}
+        for k, ci in cols.items():
+            letter = rowcol_to_a1(1, ci + 1)[:-1]
+            cells[k] = f"{letter}2:{letter}"
+        return batch_get_tabs(list(cols), cells)
+
+    def add_column(self, app_key: str, name: str):
+        def _do(sh, ws):
+            headers = QUOTA.call("read", ws.row_values, 1)
+            if name in headers:
+                return
+            col = len(headers) + 1
+            if ws.col_count < col:
+                QUOTA.call("write", ws.add_cols, col - ws.col_count, idempotent=False)
+            QUOTA.call("write", ws.update, [[name]], rowcol_to_a1(1, col))
+
+        with_ws(app_key, _do)
+
+    def load_archives(self, app_keys):
+        # cuma tab arsip yang udah ada yang dibaca (satu call metadata + satu batch read);
+        # tab arsip belum pernah dibuat = arsip kosong, bukan error
+        titles = {ws.title for ws in QUOTA.call("read", get_spreadsheet().worksheets)}
+        app_keys = list(app_keys)
+        found = [k for k in app_keys if archive_title(k) in titles]
+        out = batch_get_tabs(found, archive=True) if found else {}
+        return {k: out.get(k, []) for k in app_keys}
+
+    def reload(self):
+        reload_worksheets()
+
+
+class MirrorBackend(StorageBackend):
+    """
+    SQLite jadi data utama, Google Sheet cuma cermin yang gampang dibaca manusia.
+    Baca selalu dari SQLite. Tiap tulis: SQLite dulu, lalu diulang ke sheet;
+    kalau sheet gagal, tab ditandai dirty dan nanti ditimpa full lewat sync().
+    Edit manual di sheet bakal ketimpa waktu sync.
+    """
+
+    name = "mirror"
+
+    def __init__(self, primary: SqliteBackend, mirror: SheetsBackend):
+        self.primary = primary
+        self.mirror = mirror
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self.on_seed = None  # callback(app_key) tiap tab selesai di-import (buat buang cache lama)
+
+    def load_tabs(self, app_keys, header_only: bool = False):
+        return self.primary.load_tabs(app_keys, header_only)
+
+    def _to_mirror(self, app_key: str, fn):
+        with self._lock:
+            if app_key in self._dirty:
+                return  # bakal ditimpa full waktu sync
+        try:
+            fn()
+        except Exception as e:
+            log.warning("Mirror sheet %s gagal, ditandai buat sync: %s", app_key, e)
+            with self._lock:
+                self._dirty.add(app_key)
+
+    def append_rows(self, app_key: str, rows):
+        self.primary.append_rows(app_key, rows)
+        self._to_mirror(app_key, lambda: self.mirror.append_rows(app_key, rows))
+
+    def write_cells(self, app_key: str, cells):
+        self.primary.write_cells(app_key, cells)
+        self._to_mirror(app_key, lambda: self.mirror.write_cells(app_key, cells))
+
+    def delete_rows(self, app_key: str, row_numbers):
+        self.primary.delete_rows(app_key, row_numbers)
+        self._to_mirror(app_key, lambda: self.mirror.delete_rows(app_key, row_numbers))
+
+    def replace_tab(self, app_key: str, values):
+        self.primary.replace_tab(app_key, values)
+        self._to_mirror(app_key, lambda: self.mirror.replace_tab(app_key, values))
+
+    # arsip cuma di SQLite (data utama); sheet cermin cukup kehilangan barisnya
+    def append_archive(self, app_key: str, headers, rows):
+        self.primary.append_archive(app_key, headers, rows)
+
+    def load_archives(self, app_keys):
+        return self.primary.load_archives(app_keys)
+
+    # query ber-index langsung ke SQLite (data utama)
+    def find_emails(self, emails, app_keys):
+        return self.primary.find_emails(emails, app_keys)
+
+    def expiring_between(self, app_key: str, start: float, end: float):
+        return self.primary.expiring_between(app_key, start, end)
+
+    def add_column(self, app_key: str, name: str):
+        self.primary.add_column(app_key, name)
+        self._to_mirror(app_key, lambda: self.mirror.add_column(app_key, name))
+
+    def seed(self, app_keys=None):
+        """
+        Tab yang belum pernah di-import (gak ada penanda seeded) diambil dulu dari Google Sheet.
+        Baris yang sempat ditulis ke SQLite sebelum import (sheet lagi down) gak dibuang:
+        ditempel di bawah isi sheet dan tabnya ditandai dirty biar ikut ke-sync.
+        """
+        app_keys = [k for k in (app_keys or APPS) if not self.primary.is_seeded(k)]
+        if not app_keys:
+            return
+        for k, values in self.mirror.load_tabs(app_keys).items():
+            if isinstance(values, Exception):
+                log.warning("Import tab %s dari sheet gagal: %s", k, values)
+                continue
+            values = [list(r) for r in values] or [[]]
+            extra = []
+            if self.primary.has_tab(k):
+                local = self.primary.load_tabs([k])[k]
+                have = {tuple(self.primary._norm_row(r)) for r in values[1:]}
+                extra = [r for r in local[1:] if tuple(r) not in have]
+                if extra:
+                    values.extend(fit_rows(values[0], local[0], extra))
+            self.primary.replace_tab(k, values)
+            if self.on_seed:
+                self.on_seed(k)
+            if extra:
+                log.warning("Tab %s: %d baris lokal belum ada di sheet, ikut di-sync.", k, len(extra))
+                with self._lock:
+                    self._dirty.add(k)
+
+    def sync(self, app_keys=None):
+        """
+        Timpa tab sheet pakai isi SQLite. Default: cuma tab yang dirty.
+        Tab yang belum pernah di-import dari sheet dicoba import dulu; kalau masih gagal,
+        tab itu gak ditimpa (bisa ngapus data sheet) dan tetap dirty.
+        """
+        with self._lock:
+            keys = list(app_keys) if app_keys is not None else sorted(self._dirty)
+        pending = [k for k in keys if not self.primary.is_seeded(k)]
+        if pending:
+            self.seed(pending)
+        done = []
+        for k in keys:
+            if not self.primary.is_seeded(k):
+                log.warning("Sync tab %s dilewati: belum pernah di-import dari sheet.", k)
+                continue
+            values = self.primary.load_tabs([k])[k]
+            self.mirror.replace_tab(k, values)
+            with self._lock:
+                self._dirty.discard(k)
+            done.append(k)
+        return done
+
+    def reload(self):
+        self.mirror.reload()
+        self.seed()
+
+
+def make_backend(kind: str, required_headers=()) -> StorageBackend:
+    kind = (kind or "sheets").strip().lower()
+    if kind == "sheets":
+        return SheetsBackend()
+    if kind == "sqlite":
+        return SqliteBackend(SQLITE_PATH, default_headers=required_headers)
+    if kind == "mirror":
+        return MirrorBackend(SqliteBackend(SQLITE_PATH, default_headers=required_headers), SheetsBackend())
+    raise RuntimeError(f"STORAGE_BACKEND tidak dikenal: {kind} (pilih sheets / sqlite / mirror)")
+
+
+# ==========================================================
+# SCHEMA (header row 1 per tab)
+# ==========================================================
+REQUIRED_HEADERS = [
+    "created_datetime",
+    "email",
+    "duration_days",
+    "expire_datetime",
+    "status",
+    "customer_phone",
+    "rem14_sent",
+    "rem7_sent",
+    "rem3_sent",
+    "rem1h_sent",
+    "rem1d_sent",
+]
+
+
+class TabSchema:
+    def __init__(self, app_key: str, headers, required=REQUIRED_HEADERS):
+        self.app_key = app_key
+        self.headers = [str(h).strip() for h in headers]
+        self.cols = {}
+        for i, h in enumerate(self.headers):
+            if h and h not in self.cols:
+                self.cols[h] = i
+        self.missing = [h for h in required if h not in self.cols]
+
+    def col(self, name: str):
+        return self.cols.get(name)
+
+
+class SchemaRegistry:
+    """
+    Header semua tab, di-load + divalidasi sekali (startup / refresh),
+    bukan baca row 1 tiap kali nulis. Ikut ke-update tiap CACHE load tab.
+    """
+
+    def __init__(self):
+        self._tabs = {}
+        self._errors = {}
+        self._lock = threading.Lock()
+
+    def set(self, app_key: str, headers):
+        with self._lock:
+            self._tabs[app_key] = TabSchema(app_key, headers)
+            self._errors.pop(app_key, None)
+
+    def load(self, app_keys=None):
+        """Baca row 1 semua tab (satu batch). Return {app_key: TabSchema atau Exception}."""
+        app_keys = list(APPS) if app_keys is None else list(app_keys)
+        res = BACKEND.load_tabs(app_keys, header_only=True)
+        with self._lock:
+            for k, values in res.items():
+                if isinstance(values, Exception):
+                    self._errors[k] = values
+                else:
+                    self._tabs[k] = TabSchema(k, values[0] if values else [])
+                    self._errors.pop(k, None)
+        return {k: self._tabs.get(k) or self._errors.get(k) for k in app_keys}
+
+    def get(self, app_key: str) -> TabSchema:
+        """Schema tab (load dulu kalau belum pernah). Raise kalau tab error."""
+        if app_key not in self._tabs:
+            res = self.load([app_key])[app_key]
+            if isinstance(res, Exception):
+                raise res
+        return self._tabs[app_key]
+
+    def problems(self):
+        """List teks masalah (kolom kurang / tab error) buat semua tab yang udah dicek."""
+        out = []
+        with self._lock:
+            for k in APPS:
+                if k in self._errors:
+                    e = self._errors[k]
+                    out.append(f"{APPS[k]['title']}: {type(e).__name__} - {str(e)[:120]}")
+                elif k in self._tabs and self._tabs[k].missing:
+                    out.append(f"{APPS[k]['title']}: kurang kolom {', '.join(self._tabs[k].missing)}")
+        return out
+
+
+SCHEMA = SchemaRegistry()
+
+
+BACKEND = make_backend(STORAGE_BACKEND, REQUIRED_HEADERS)
+
+
+# ==========================================================
+# CACHE
+# ==========================================================
+def load_tabs(app_keys):
+    """Loader buat CACHE: isi penuh tiap tab, header-nya sekalian masuk SCHEMA."""
+    out = BACKEND.load_tabs(app_keys)
+    for k, values in out.items():
+        if not isinstance(values, Exception):
+            SCHEMA.set(k, values[0] if values else [])
+    return out
+
+
+# satu cache buat semua handler + job (hemat kuota read); delta sync cuma buat engine sheets
+CACHE = SheetCache(
+    load_tabs,
+    ttl=CACHE_TTL,
+    tail_loader=getattr(BACKEND, "load_tails", None),
+    full_every=CACHE_FULL_RELOAD,
+)
+if isinstance(BACKEND, MirrorBackend):
+    # tab yang baru di-import dari sheet: snapshot lama (kosong) dibuang
+    BACKEND.on_seed = CACHE.invalidate
+
+
+# ==========================================================
+# WARM START (snapshot CACHE di disk)
+# ==========================================================
+def save_warm_snapshot(path: str = WARM_SNAPSHOT_PATH) -> int:
+    """Tulis semua tab yang ada di CACHE ke disk. Return jumlah tab."""
+    if not path:
+        return 0
+    header, blobs = CACHE.dump(warm_start.encode)
+    if not header["tabs"]:
+        return 0
+    warm_start.write(path, header, blobs)
+    return len(header["tabs"])
+
+
+def load_warm_snapshot(path: str = WARM_SNAPSHOT_PATH, max_age: float = WARM_SNAPSHOT_MAX_AGE) -> int:
+    """
+    Isi CACHE + SCHEMA dari snapshot disk (kalau ada dan belum kelamaan).
+    Umur snapshot ikut kehitung ke TTL; refresh beneran jalan lewat job cache di background.
+    Yang butuh data pasti (flush journal) load ulang dulu tab yang masih from_disk.
+    """
+    if not path or not os.path.exists(path):
+        return 0
+    try:
+        saved_at, snaps = warm_start.read(path, app_keys=set(APPS))
+    except Exception as e:
+        log.warning("Snapshot warm start %s gak kebaca, skip: %s", path, e)
+        return 0
+    age = time.time() - saved_at
+    if age > max_age:
+        log.info("Snapshot warm start umurnya %.0f detik, kelamaan, skip.", age)
+        return 0
+    for snap in snaps:
+        SCHEMA.set(snap.app_key, snap.headers)
+    CACHE.preload(snaps)
+    log.info("Warm start: %d tab dari snapshot (umur %.0f detik).", len(snaps), age)
+    return len(snaps)
+
+
+# ==========================================================
+# CARI EMAIL (engine sheets: index CACHE, engine SQLite / mirror: query ber-index)
+# ==========================================================
+def _sql_hit(app_key: str, cols, rn: int, row) -> EmailHit:
+    def get(name, default):
+        i = cols.get(name)
+        return row[i] if i is not None and i < len(row) else default
+
+    exp = get("expire_datetime", "-")
+    return EmailHit(app_key, rn, exp, get("status", "-"), get("customer_phone", ""), expire_epoch(exp))
+
+
+def lookup_emails(emails, app_keys):
+    """
+    Banyak email sekaligus -> ({email: [EmailHit]}, errors), key email sesuai input.
+    Engine SQLite / mirror gak perlu load tab ke cache: satu query lewat index email.
+    """
+    emails, app_keys = list(emails), list(app_keys)
+    if not hasattr(BACKEND, "find_emails"):
+        return CACHE.lookup_emails(emails, app_keys)
+    found = BACKEND.find_emails(emails, app_keys)
+    cols = {
+        k: TabSchema(k, v[0] if v else []).cols
+        for k, v in BACKEND.load_tabs(app_keys, header_only=True).items()
+    }
+    order = {k: i for i, k in enumerate(app_keys)}
+    out = {}
+    for email in emails:
+        rows = sorted(found.get(norm_email(email), ()), key=lambda x: (order[x[0]], x[1]))
+        out[email] = [_sql_hit(k, cols[k], rn, row) for k, rn, row in rows]
+    return out, {}
+
+
+def lookup_email(email: str, app_keys):
+    """Return (hits, errors) buat satu email, lihat lookup_emails."""
+    if not hasattr(BACKEND, "find_emails"):
+        return CACHE.lookup_email(email, app_keys)
+    out, errors = lookup_emails([email], app_keys)
+    return out[email], errors
+
+
+# ==========================================================
+# ROW ID + LOCK PER TAB
+# ==========================================================
+# row_id = id acak per baris (kolom opsional "row_id"), gak ikut geser waktu baris
+# di atasnya dihapus. Tulis ke baris lama lewat row_id, nomor barisnya dicari ulang
+# dari kolom row_id terbaru tepat sebelum nulis.
+# Semua tulis/hapus ke satu tab jalan di bawah lock tab itu (RLock, dipegang di thread
+# worker SHEETS), jadi reminder, hapus dobel, arsip, dan flush akun baru gak saling tabrak.
+ROW_ID = "row_id"
+
+_TAB_LOCKS = {}
+_TAB_LOCKS_GUARD = threading.Lock()
+
+
+def new_row_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+def tab_lock(app_key: str):
+    with _TAB_LOCKS_GUARD:
+        return _TAB_LOCKS.setdefault(app_key, threading.RLock())
+
+
+@contextmanager
+def tab_locks(app_keys):
+    """Kunci banyak tab sekaligus, urutan tetap (sorted) biar gak deadlock."""
+    with ExitStack() as stack:
+        for k in sorted(set(app_keys)):
+            stack.enter_context(tab_lock(k))
+        yield
+
+
+def current_row_ids(app_keys):
+    """
+    {app_key: list row_id per baris (index 0 = row 2) atau Exception}.
+    Engine sheets: kolom row_id dibaca langsung (satu batch read semua tab);
+    engine SQLite: dari cache (SQLite sendiri sumber datanya).
+    """
+    out, cols = {}, {}
+    for k in app_keys:
+        ci = SCHEMA.get(k).col(ROW_ID)
+        if ci is None:
+            out[k] = RuntimeError(f"Tab {k} belum punya kolom {ROW_ID}.")
+        else:
+            cols[k] = ci
+    loader = getattr(BACKEND, "load_column", None)
+    if loader is not None and cols:
+        for k, values in loader(cols).items():
+            if isinstance(values, Exception):
+                out[k] = values
+            else:
+                out[k] = [str(r[0]).strip() if r else "" for r in values]
+    else:
+        for k in cols:
+            try:
+                snap = CACHE.get(k)
+                out[k] = [str(snap.cell(r, ROW_ID)).strip() for r in snap.rows]
+            except Exception as e:
+                out[k] = e
+    return out
+
+
+def _check_positions(app_key: str, ids) -> bool:
+    """
+    Snapshot cache yang urutan row_id-nya beda dari sheet (ada baris geser) dibuang.
+    Return True kalau geser (atau gak ada snapshot buat dibandingin).
+    """
+    snap = CACHE.peek(app_key)
+    if snap is None:
+        return True
+    cached = [str(snap.cell(r, ROW_ID)).strip() for r in snap.rows]
+    # sheet gak ngirim baris kosong di ujung bawah
+    if cached[:len(ids)] != ids or any(cached[len(ids):]):
+        CACHE.invalidate(app_key)
+        return True
+    return False
+
+
+# ==========================================================
+# WRITE (sync, sekalian update cache)
+# ==========================================================
+def append_rows(app_key: str, rows):
+    with tab_lock(app_key):
+        BACKEND.append_rows(app_key, rows)
+        for row in rows:
+            CACHE.apply_append(app_key, row)
+
+
+def write_cells_many(plan):
+    """
+    plan: {app_key: cells}, cells = (baris, col_index_0, value); baris = nomor baris (int)
+    atau row_id (str). row_id semua tab di-resolve dari satu batch read, di bawah lock tab.
+    Return {app_key: list baris yang di-skip atau Exception}: row_id yang udah gak ada, plus
+    nomor baris (int) kalau ternyata baris di tab itu geser (nomornya dari snapshot lama).
+    """
+    out = {}
+    with tab_locks(plan):
+        need = [k for k, cells in plan.items() if any(isinstance(r, str) for r, _, _ in cells)]
+        fresh = current_row_ids(need) if need else {}
+        for app_key, cells in plan.items():
+            lost = []
+            try:
+                if app_key in fresh:
+                    ids = fresh[app_key]
+                    if isinstance(ids, Exception):
+                        raise ids
+                    shifted = _check_positions(app_key, ids)
+                    pos = {}
+                    for i, rid in enumerate(ids):
+                        if rid:
+                            pos.setdefault(rid, i + 2)
+                    resolved = []
+                    for ref, ci, val in cells:
+                        if isinstance(ref, str):
+                            if ref not in pos:
+                                lost.append(ref)
+                                continue
+                            ref = pos[ref]
+                        elif shifted:
+                            # baris tanpa row_id: nomornya udah gak bisa dipercaya
+                            lost.append(ref)
+                            continue
+                        resolved.append((ref, ci, val))
+                    cells = resolved
+                if cells:
+                    BACKEND.write_cells(app_key, cells)
+                    CACHE.apply_cells(app_key, cells)
+                out[app_key] = sorted(set(lost), key=str)
+            except Exception as e:
+                out[app_key] = e
+    return out
+
+
+def write_cells(app_key: str, cells):
+    """Tulis sel satu tab (baris = nomor atau row_id, lihat write_cells_many). Return row_id yang hilang."""
+    res = write_cells_many({app_key: cells})[app_key]
+    if isinstance(res, Exception):
+        raise res
+    return res
+
+
+def delete_rows(app_key: str, row_numbers):
+    with tab_lock(app_key):
+        try:
+            BACKEND.delete_rows(app_key, row_numbers)
+        except Exception:
+            # status hapus gak pasti -> snapshot dibuang
+            CACHE.invalidate(app_key)
+            raise
+        CACHE.apply_delete(app_key, row_numbers)
+
+
+def assign_row_ids(app_key: str) -> int:
+    """
+    Pastikan tab punya kolom row_id dan tiap baris isi punya id unik (baris yang
+    ditambah manual / hasil copy-paste). Header dibuat kalau belum ada. Return jumlah id baru.
+    """
+    with tab_lock(app_key):
+        snap = CACHE.get(app_key, force=True)
+        if snap.col(ROW_ID) is None:
+            BACKEND.add_column(app_key, ROW_ID)
+            snap = CACHE.get(app_key, force=True)
+        ci = snap.col(ROW_ID)
+        seen = set()
+        cells = []
+        for rn, row in enumerate(snap.rows, start=2):
+            if not any(str(x).strip() for x in row):
+                continue
+            rid = str(snap.cell(row, ROW_ID)).strip()
+            if not rid or rid in seen:
+                rid = new_row_id()
+                cells.append((rn, ci, rid))
+            seen.add(rid)
+        if cells:
+            write_cells(app_key, cells)
+        return len(cells)
+
+
+# ==========================================================
+# JOURNAL FLUSH (write-behind akun baru)
+# ==========================================================
+JOURNAL = AccountJournal(JOURNAL_PATH)
+_FLUSH_LOCK = threading.Lock()
+
+
+def _already_in_sheet(app_key: str, row) -> bool:
+    """
+    Baris journal yang ternyata udah masuk sheet (bot mati setelah append
+    tapi sebelum journal dihapus). Dicocokkan dari row_id, atau email + created_datetime.
+    """
+    cols = SCHEMA.get(app_key).cols
+    ie, ic, ir = cols.get("email"), cols.get("created_datetime"), cols.get(ROW_ID)
+    if ie is None or ic is None or ie >= len(row) or ic >= len(row):
+        return False
+    CACHE.get(app_key)  # error load langsung naik
+    found = [r for _, r in CACHE.rows_for_email(app_key, row[ie])]
+
+    def cell(r, i):
+        return str(r[i]).strip() if i is not None and i < len(r) else ""
+
+    rid = cell(row, ir)
+    if rid:
+        return any(cell(r, ir) == rid for r in found)
+    created = cell(row, ic)
+    return any(cell(r, ic) == created for r in found)
+
+
+def flush_journal(batch_size: int = JOURNAL_BATCH) -> int:
+    """Kirim semua antrian journal ke tab masing-masing (append_rows per batch). Return jumlah yang masuk."""
+    with _FLUSH_LOCK:
+        by_app = {}
+        for jid, app_key, row in JOURNAL.pending():
+            by_app.setdefault(app_key, []).append((jid, row))
+
+        total = 0
+        for app_key, entries in by_app.items():
+            snap = CACHE.peek(app_key)
+            if snap is not None and snap.from_disk:
+                # snapshot warm start bisa belum punya baris yang ke-append pas sebelum mati
+                try:
+                    if CACHE.get(app_key, force=True).from_disk:
+                        raise RuntimeError("load ketabrak tulis lain, snapshot disk masih kepakai")
+                except Exception as e:
+                    log.warning("Flush journal %s ditunda, tab gagal di-load: %s", app_key, e)
+                    continue
+            for i in range(0, len(entries), batch_size):
+                chunk = entries[i:i + batch_size]
+                ids = [jid for jid, _ in chunk]
+                try:
+                    rows = [row for _, row in chunk if not _already_in_sheet(app_key, row)]
+                    if rows:
+                        append_rows(app_key, rows)
+                except Exception as e:
+                    JOURNAL.failed(ids, f"{type(e).__name__}: {e}")
+                    log.warning("Flush journal %s gagal (%d baris): %s", app_key, len(ids), e)
+                    break
+                JOURNAL.done(ids)
+                total += len(ids)
+        return total
+
+
+# ==========================================================
+# ARSIP (akun lama yang udah EXPIRED dipindah keluar tab aktif)
+# ==========================================================
+def archive_expired(app_key: str, grace_days: float = ARCHIVE_GRACE_DAYS,
+                    limit: int = ARCHIVE_BATCH, now: float = None) -> int:
+    """
+    Pindahin baris EXPIRED yang expire-nya lewat `grace_days` ke arsip app:
+    satu append ke arsip, lalu satu batch hapus di tab aktif. Return jumlah baris.
+    Append duluan: kalau hapus gagal, paling banter baris dobel di arsip, gak ada yang hilang.
+    """
+    if grace_days <= 0:
+        return 0
+    now = time.time() if now is None else now
+    cutoff = now - grace_days * 86400
+    # nomor baris buat hapus diambil dari data paling baru, di bawah lock tab
+    with tab_lock(app_key):
+        snap = CACHE.get(app_key, force=True)
+        cols = snap.columns
+        picked = [
+            i for i, (st, exp) in enumerate(zip(cols.status, cols.expire))
+            if st == STATUS_EXPIRED and exp <= cutoff
+        ][:limit]
+        if not picked:
+            return 0
+
+        stamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        headers = snap.headers + ["archived_datetime"]
+        width = len(snap.headers)
+        rows = [(snap.rows[i] + [""] * width)[:width] + [stamp] for i in picked]
+        BACKEND.append_archive(app_key, headers, rows)
+        delete_rows(app_key, [i + 2 for i in picked])
+        log.info("Arsip %s: %d baris dipindah.", app_key, len(picked))
+        return len(picked)
+
+
+def archive_lookup(emails, app_keys):
+    """
+    Cari email di arsip (gak di-cache, download tab arsip tiap kali; fallback /cek yang lebih lambat).
+    Return ({email: [EmailHit]}, errors).
+    """
+    app_keys = list(app_keys)
+    wanted = {norm_email(e): e for e in emails}
+    out = {e: [] for e in emails}
+    errors = {}
+    for k, values in BACKEND.load_archives(app_keys).items():
+        if isinstance(values, Exception):
+            errors[k] = values
+            continue
+        snap = TabSnapshot(k, values)
+        for i, email in enumerate(snap.columns.email):
+            if email in wanted:
+                out[wanted[email]].append(snap.hit(i + 2))
+    return out, errors
+
+
+# ==========================================================
+# ASYNC FACADE (semua I/O sheet jalan di thread pool, event loop gak ke-block)
+# ==========================================================
+class AsyncSheets:
+    """
+    Semua call gspread dari handler lewat sini.
+    - thread pool terbatas (workers) -> gak spawn thread sembarangan
+    - semaphore -> maksimal `workers` call jalan bareng, sisanya antri
+    - timeout per call -> satu tab lemot gak bikin handler nunggu selamanya
+    - priority -> job BACKGROUND maksimal workers-1 thread + ngalah di token bucket QUOTA,
+      jadi handler user selalu kebagian duluan
+    Timeout cuma berhenti nunggu; thread-nya tetap selesai di background.
+    """
+
+    def __init__(self, workers: int = 4, timeout: float = 30):
+        self.timeout = timeout
+        self._workers = max(1, workers)
+        self._pool = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="sheets")
+        self._sem = None
+        self._bg_sem = None
+
+    async def run(self, fn, *args, timeout: float = None, priority: int = INTERACTIVE, **kwargs):
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self._workers)
+            self._bg_sem = asyncio.Semaphore(max(1, self._workers - 1))
+        try:
+            return await self._run(fn, args, kwargs, timeout, priority)
+        except asyncio.TimeoutError:
+            METRICS.inc("sheets_timeouts", (("fn", getattr(fn, "__name__", "call")),))
+            raise
+
+    async def _run(self, fn, args, kwargs, timeout, priority):
+        loop = asyncio.get_running_loop()
+        call = functools.partial(with_priority(priority, fn), *args, **kwargs)
+        if priority == BACKGROUND:
+            async with self._bg_sem, self._sem:
+                fut = loop.run_in_executor(self._pool, call)
+                return await asyncio.wait_for(fut, timeout or self.timeout)
+        async with self._sem:
+            fut = loop.run_in_executor(self._pool, call)
+            return await asyncio.wait_for(fut, timeout or self.timeout)
+
+    async def snapshots(
+        self, app_keys, force: bool = False, max_age: float = None, timeout: float = None, priority: int = INTERACTIVE
+    ):
+        return await self.run(CACHE.get_many, list(app_keys), force, max_age, timeout=timeout, priority=priority)
+
+    async def lookup_email(self, email: str, app_keys, timeout: float = None):
+        return await self.run(lookup_email, email, list(app_keys), timeout=timeout)
+
+    async def lookup_emails(self, emails, app_keys, timeout: float = None):
+        return await self.run(lookup_emails, list(emails), list(app_keys), timeout=timeout)
+
+    async def archive_lookup(self, emails, app_keys, timeout: float = None):
+        return await self.run(archive_lookup, list(emails), list(app_keys), timeout=timeout)
+
+    async def archive_expired(self, app_key: str, timeout: float = None, priority: int = BACKGROUND):
+        return await self.run(archive_expired, app_key, timeout=timeout, priority=priority)
+
+    async def schema(self, app_key: str, timeout: float = None) -> TabSchema:
+        return await self.run(SCHEMA.get, app_key, timeout=timeout)
+
+    async def load_schema(self, app_keys=None, timeout: float = None, priority: int = INTERACTIVE):
+        return await self.run(SCHEMA.load, app_keys, timeout=timeout, priority=priority)
+
+    async def refresh_credentials(self, timeout: float = None, priority: int = BACKGROUND):
+        return await self.run(refresh_credentials, timeout=timeout, priority=priority)
+
+    async def reload(self, timeout: float = None, priority: int = INTERACTIVE):
+        return await self.run(BACKEND.reload, timeout=timeout, priority=priority)
+
+    async def sync_mirror(self, timeout: float = None, priority: int = BACKGROUND):
+        if not isinstance(BACKEND, MirrorBackend):
+            return []
+        return await self.run(BACKEND.sync, timeout=timeout, priority=priority)
+
+    async def append_rows(self, app_key: str, rows, timeout: float = None):
+        return await self.run(append_rows, app_key, rows, timeout=timeout)
+
+    async def save_snapshot(self, timeout: float = None, priority: int = BACKGROUND):
+        return await self.run(save_warm_snapshot, timeout=timeout, priority=priority)
+
+    async def flush_journal(self, batch_size: int = JOURNAL_BATCH, timeout: float = None):
+        return await self.run(flush_journal, batch_size, timeout=timeout)
+
+    async def write_cells_many(self, plan, timeout: float = None, priority: int = INTERACTIVE):
+        return await self.run(write_cells_many, plan, timeout=timeout, priority=priority)
+
+    async def assign_row_ids(self, app_key: str, timeout: float = None, priority: int = BACKGROUND):
+        return await self.run(assign_row_ids, app_key, timeout=timeout, priority=priority)
+
+    async def write_cells(self, app_key: str, cells, timeout: float = None, priority: int = INTERACTIVE):
+        return await self.run(write_cells, app_key, cells, timeout=timeout, priority=priority)
+
+    async def delete_rows(self, app_key: str, row_numbers, timeout: float = None):
+        return await self.run(delete_rows, app_key, row_numbers, timeout=timeout)
+
+
+SHEETS = AsyncSheets(workers=SHEETS_WORKERS, timeout=SHEETS_TIMEOUT)
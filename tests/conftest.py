@@ -0,0 +1,25 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+# bench.py udah nyiapin env (engine sheets, journal + owner di folder temp) sebelum import bot
+import bench  # noqa: E402
+import bot  # noqa: E402
+import fake_sheets  # noqa: E402
+import storage  # noqa: E402
+
+
+@pytest.fixture
+def sheet():
+    """Fake Google Sheet 60 baris per tab (tanpa dobel), udah kepasang ke storage."""
+    sh = fake_sheets.FakeSpreadsheet()
+    bench.seed(sh, 60, dup_ratio=0)
+    fake_sheets.install(sh)
+    bot.REMINDERS.clear()
+    bot._LAST_SCAN = None
+    storage.JOURNAL.done([jid for jid, _, _ in storage.JOURNAL.pending()])
+    yield sh
+    storage.CACHE.invalidate()
@@ -0,0 +1,24 @@
+import asyncio
+
+import bench
+import bot
+
+
+def _bulk(text):
+    up = bench._Update(text)
+    state = asyncio.run(bot.entry_bulkadd(up, bench._Ctx()))
+    return state, up.message.replies
+
+
+def test_bulkadd_data_di_baris_yang_sama(sheet):
+    values = sheet.tab(bot.APPS["canva"]["sheet"]).values
+    n = len(values)
+    state, replies = _bulk("/bulkadd canva,satu@x.com,30,08123456789\ncanva,dua@x.com,7,08123456780")
+    assert state != bot.BULK_ADD
+    assert [r[1] for r in values[n:]] == ["satu@x.com", "dua@x.com"]
+
+
+def test_bulkadd_tanpa_data_minta_daftar(sheet):
+    state, replies = _bulk("/bulkadd")
+    assert state == bot.BULK_ADD
+    assert "satu akun per baris" in replies[-1]
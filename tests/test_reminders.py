@@ -0,0 +1,53 @@
+import time
+
+import bot
+import storage
+from sheet_cache import expire_epoch
+
+
+def _values(sh, app_key):
+    return sh.tab(bot.APPS[app_key]["sheet"]).values
+
+
+def test_collect_pakai_satu_snapshot_walau_ada_reload(sheet, monkeypatch):
+    # staff hapus baris + job lain reload penuh, pas di antara get_many dan lookup baris
+    values = _values(sheet, "canva")
+    hdr = values[0]
+    i_email, i_exp, i_status = hdr.index("email"), hdr.index("expire_datetime"), hdr.index("status")
+    now = time.time()
+    row = next(r for r in values[10:] if expire_epoch(r[i_exp]) < now)
+    key = ("canva", row[i_email], expire_epoch(row[i_exp]))
+
+    real = storage.CACHE.get_many
+
+    def racing(app_keys, *args, **kwargs):
+        out = real(app_keys, *args, **kwargs)
+        del values[1:3]
+        real(app_keys, force=True)
+        return out
+
+    storage.CACHE.get_many(["canva"])
+    monkeypatch.setattr(storage.CACHE, "get_many", racing)
+    res = bot._collect_reminders(now, {"canva": [key]})
+    monkeypatch.undo()
+
+    msgs, cells, nexts, refs = res["canva"]
+    assert cells
+    storage.write_cells_many({"canva": cells})
+    expired = [r[i_email] for r in values[1:] if r[i_status] == "EXPIRED"]
+    assert expired == [row[i_email]]
+
+
+def test_collect_requeue_kalau_snapshot_dibuang(sheet, monkeypatch):
+    now = time.time()
+    key = ("canva", "user5@canva.test", now - 10)
+    real = storage.CACHE.get_many
+
+    def dropped(app_keys, *args, **kwargs):
+        out = real(app_keys, *args, **kwargs)
+        storage.CACHE.invalidate("canva")
+        return out
+
+    monkeypatch.setattr(storage.CACHE, "get_many", dropped)
+    assert bot._collect_reminders(now, {"canva": [key]}) == {}
+    assert key in bot.REMINDERS._due
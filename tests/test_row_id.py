@@ -0,0 +1,55 @@
+import storage
+
+
+def _setup(sh, app_key="canva"):
+    storage.assign_row_ids(app_key)
+    values = sh.tab(storage.APPS[app_key]["sheet"]).values
+    storage.CACHE.get(app_key, force=True)
+    return values, values[0].index("status"), values[0].index(storage.ROW_ID)
+
+
+def _status_of(values, ci, ri):
+    return {r[ri]: r[ci] for r in values[1:]}
+
+
+def test_tab_geser_skip_nomor_baris(sheet):
+    values, ci, ri = _setup(sheet)
+    rid = values[10][ri]
+    target = values[20][ri]
+    del values[1:3]  # staff hapus 2 baris di atas, snapshot cache masih versi lama
+
+    out = storage.write_cells_many({"canva": [(rid, ci, "A"), (21, ci, "B")]})
+
+    assert out == {"canva": [21]}
+    status = _status_of(values, ci, ri)
+    assert status[rid] == "A"
+    assert "B" not in status.values()  # baris 21 sekarang milik akun lain
+    assert status[target] != "B"
+    assert storage.CACHE.peek("canva") is None  # snapshot yang geser dibuang
+
+
+def test_row_id_yang_dihapus_dilaporkan(sheet):
+    values, ci, ri = _setup(sheet)
+    gone = values[5][ri]
+    keep = values[30][ri]
+    del values[5]
+
+    out = storage.write_cells_many({"canva": [(gone, ci, "X"), (keep, ci, "Y")]})
+
+    assert out == {"canva": [gone]}
+    status = _status_of(values, ci, ri)
+    assert gone not in status
+    assert [k for k, v in status.items() if v == "Y"] == [keep]
+    assert "X" not in status.values()
+
+
+def test_gak_geser_nomor_baris_tetap_ditulis(sheet):
+    values, ci, ri = _setup(sheet)
+    rid = values[3][ri]
+
+    out = storage.write_cells_many({"canva": [(rid, ci, "A"), (8, ci, "B")]})
+
+    assert out == {"canva": []}
+    assert values[3][ci] == "A" and values[7][ci] == "B"
+    snap = storage.CACHE.peek("canva")
+    assert snap.rows[2][ci] == "A" and snap.rows[6][ci] == "B"
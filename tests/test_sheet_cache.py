@@ -0,0 +1,91 @@
+import time
+
+import storage
+from sheet_cache import SheetCache
+import bot
+
+KEYS = list(bot.APPS)
+
+
+def _values(sh, app_key):
+    return sh.tab(bot.APPS[app_key]["sheet"]).values
+
+
+def _age_all(seconds):
+    for snap in storage.CACHE._tabs.values():
+        snap.loaded_at -= seconds
+
+
+def _same_as_sheet(sh, app_key):
+    snap = storage.CACHE.peek(app_key)
+    values = _values(sh, app_key)
+    return snap.rows == values[1:] and list(snap.columns.email) == [r[1].lower() for r in values[1:]]
+
+
+def _refresh(sh):
+    _age_all(storage.CACHE_TTL + 1)
+    sh.reset_calls()
+    storage.CACHE.get_many(KEYS)
+    return dict(sh.calls)
+
+
+def test_tail_append_cuma_baca_ekor(sheet):
+    storage.CACHE.get_many(KEYS)
+    values = _values(sheet, "canva")
+    row = list(values[5])
+    row[1] = "baru@canva.test"
+    values.append(row)
+    full_at = dict(storage.CACHE._full_at)
+
+    assert _refresh(sheet) == {"values_batch_get": 1}
+    assert _same_as_sheet(sheet, "canva")
+    assert storage.CACHE._full_at == full_at  # gak load penuh
+    hits, _ = storage.CACHE.lookup_email("baru@canva.test", ["canva"])
+    assert [h.row_number for h in hits] == [len(values)]
+
+
+def test_hapus_di_tengah_load_penuh(sheet):
+    storage.CACHE.get_many(KEYS)
+    values = _values(sheet, "canva")
+    gone = values[10][1]
+    del values[10]
+
+    # ekor gak berubah panjang tapi checksum beda -> satu batch ekor + satu load penuh
+    assert _refresh(sheet) == {"values_batch_get": 2}
+    assert _same_as_sheet(sheet, "canva")
+    assert storage.CACHE.lookup_email(gone, ["canva"])[0] == []
+
+
+def test_edit_di_ekor_load_penuh(sheet):
+    storage.CACHE.get_many(KEYS)
+    values = _values(sheet, "deepl")
+    values[-1][4] = "EXPIRED"
+    assert _refresh(sheet) == {"values_batch_get": 2}
+    assert _same_as_sheet(sheet, "deepl")
+
+
+def test_load_penuh_berkala(sheet):
+    storage.CACHE.get_many(KEYS)
+    for k in storage.CACHE._full_at:
+        storage.CACHE._full_at[k] -= storage.CACHE.full_every + 1
+    assert _refresh(sheet) == {"values_batch_get": 1}
+    assert all(_same_as_sheet(sheet, k) for k in KEYS)
+
+
+def test_write_through_selama_load_gak_hilang():
+    data = {"a": [["email", "expire_datetime"], ["x@y.com", "2030-01-01 00:00:00"]]}
+    cache = SheetCache(lambda keys: {k: [list(r) for r in data[k]] for k in keys}, ttl=60)
+    cache.get("a")
+
+    real = cache._loader
+
+    def loader(keys):
+        out = real(keys)  # data dibaca sebelum append di bawah
+        cache.apply_append("a", ["baru@y.com", "2030-01-01 00:00:00"])
+        return out
+
+    cache._loader = loader
+    snap = cache.get("a", force=True)
+    # load yang ketabrak write-through: snapshot lama (udah ada baris baru) dipakai, ditandai basi
+    assert [r[0] for r in snap.rows] == ["x@y.com", "baru@y.com"]
+    assert cache._is_stale("a", time.monotonic())
@@ -0,0 +1,77 @@
+import sqlite3
+
+import bot
+import storage
+from backends import SqliteBackend
+from sheet_cache import expire_epoch
+
+
+def _copy_to_sqlite(sh, path):
+    b = SqliteBackend(str(path), default_headers=storage.REQUIRED_HEADERS)
+    for k, v in bot.APPS.items():
+        b.replace_tab(k, sh.tab(v["sheet"]).values)
+    return b
+
+
+def test_query_ber_index(sheet, tmp_path):
+    b = _copy_to_sqlite(sheet, tmp_path / "a.db")
+    plan = " ".join(r[3] for r in b._db.execute(
+        "EXPLAIN QUERY PLAN SELECT email, app_key, pos, data_json FROM rows WHERE email IN (?) ORDER BY pos", ("x",)
+    ))
+    assert "rows_email" in plan
+    plan = " ".join(r[3] for r in b._db.execute(
+        "EXPLAIN QUERY PLAN SELECT pos FROM rows WHERE app_key = ? AND expire_ts >= ? AND expire_ts < ?", ("x", 0, 1)
+    ))
+    assert "rows_expire_ts" in plan
+
+    found = b.find_emails(["USER7@canva.test"], ["canva", "deepl"])
+    assert [(k, rn) for k, rn, _ in found["user7@canva.test"]] == [("canva", 9)]
+
+    values = sheet.tab(bot.APPS["canva"]["sheet"]).values
+    exps = sorted(expire_epoch(r[3]) for r in values[1:])
+    start, end = exps[10], exps[20]
+    got = b.expiring_between("canva", start, end)
+    assert [expire_epoch(r[3]) for _, r in got] == exps[10:20]
+
+    # tulis ikut update kolom index
+    b.write_cells("canva", [(9, 1, "ganti@x.com")])
+    assert "user7@canva.test" not in b.find_emails(["user7@canva.test"], ["canva"])
+    assert b.find_emails(["ganti@x.com"], ["canva"])["ganti@x.com"][0][1] == 9
+
+
+def test_file_lama_dimigrasi(tmp_path):
+    path = str(tmp_path / "lama.db")
+    db = sqlite3.connect(path)
+    db.executescript(
+        "CREATE TABLE tabs (app_key TEXT PRIMARY KEY, headers_json TEXT NOT NULL);"
+        "CREATE TABLE rows (app_key TEXT NOT NULL, pos INTEGER NOT NULL, data_json TEXT NOT NULL);"
+        """INSERT INTO tabs VALUES ('a', '["email", "expire_datetime"]');"""
+        """INSERT INTO rows VALUES ('a', 2, '["X@y.com", "2030-01-01 00:00:00"]');"""
+    )
+    db.commit()
+    db.close()
+    b = SqliteBackend(path)
+    assert b.find_emails(["x@y.com"], ["a"])["x@y.com"][0][1] == 2
+    assert [rn for rn, _ in b.expiring_between("a", 0, float("inf"))] == [2]
+
+
+def test_lookup_dan_scan_lewat_sql_sama_kayak_cache(sheet, tmp_path, monkeypatch):
+    emails = ["user3@canva.test", "USER40@deepl.test", "gak@ada.com"]
+    by_cache, _ = storage.lookup_emails(emails, bot.APPS)
+    assert bot._scan_deadlines() > 0
+    queue_cache = dict(bot.REMINDERS._due)
+
+    b = _copy_to_sqlite(sheet, tmp_path / "b.db")
+    monkeypatch.setattr(storage, "BACKEND", b)
+    monkeypatch.setattr(bot, "BACKEND", b)
+    storage.CACHE.invalidate()
+    sheet.reset_calls()
+    by_sql, errors = storage.lookup_emails(emails, bot.APPS)
+    assert not errors and by_sql == by_cache
+    assert storage.lookup_email("user3@canva.test", bot.APPS)[0] == by_cache["user3@canva.test"]
+
+    bot.REMINDERS.clear()
+    bot._LAST_SCAN = None
+    bot._scan_deadlines()
+    assert dict(bot.REMINDERS._due) == queue_cache
+    assert storage.CACHE.peek("canva") is None and sheet.total_calls() == 0
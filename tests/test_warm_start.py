@@ -0,0 +1,55 @@
+import time
+
+import bot
+import storage
+import warm_start
+
+
+def _values(sh, app_key):
+    return sh.tab(bot.APPS[app_key]["sheet"]).values
+
+
+def test_umur_snapshot_disk_ikut_kehitung(sheet, tmp_path):
+    path = str(tmp_path / "snap.bin")
+    storage.CACHE.get_many(bot.APPS)
+    assert storage.save_warm_snapshot(path) == len(bot.APPS)
+
+    storage.CACHE.invalidate()
+    storage.load_warm_snapshot(path)
+    snap = storage.CACHE.peek("canva")
+    assert snap.from_disk
+    assert time.monotonic() - snap.loaded_at >= 0
+    sheet.reset_calls()
+    assert storage.CACHE.get("canva") is snap  # masih dalam TTL: gak load
+
+    # file lama (umur > TTL) langsung dianggap basi
+    storage.CACHE.invalidate()
+    saved_at, snaps = warm_start.read(path)
+    assert all(s.from_disk for s in snaps)
+    old = time.monotonic() - storage.CACHE_TTL - 1
+    for s in snaps:
+        s.loaded_at = old
+    storage.CACHE.preload(snaps)
+    canva = next(s for s in snaps if s.app_key == "canva")
+    assert storage.CACHE.get("canva") is not canva
+    assert not storage.CACHE.peek("canva").from_disk
+
+
+def test_flush_setelah_restart_gak_dobel(sheet, tmp_path):
+    # append sukses tepat sebelum mati, journal-nya belum sempat dihapus
+    path = str(tmp_path / "snap.bin")
+    storage.CACHE.get_many(bot.APPS)
+    storage.save_warm_snapshot(path)
+
+    values = _values(sheet, "canva")
+    row = list(values[5])
+    row[values[0].index("email")] = "baru@canva.test"
+    row[values[0].index(storage.ROW_ID)] = storage.new_row_id()
+    storage.JOURNAL.add("canva", row)
+    values.append(list(row))
+
+    storage.CACHE.invalidate()
+    storage.load_warm_snapshot(path)
+    storage.flush_journal()
+    assert [r[1] for r in values].count("baru@canva.test") == 1
+    assert not storage.JOURNAL.pending()
@@ -0,0 +1,99 @@
+import json
+import mmap
+import os
+import struct
+import time
+from array import array
+
+from sheet_cache import TabSnapshot
+
+# ==========================================================
+# SNAPSHOT DISK (warm start setelah restart / redeploy)
+# ==========================================================
+# Format file:
+#   MAGIC | panjang header (uint64 LE) | header JSON | blob...
+# Header nyimpen offset tiap blob per tab: isi tab (JSON values) + kolom
+# array bertipe (bytes mentah array.tobytes), jadi waktu load tanggal gak
+# di-parse ulang. File dibaca lewat mmap, ditulis atomik (tmp + rename).
+
+MAGIC = b"ASNBSNAP1\n"
+_LEN = struct.Struct("<Q")
+_ARRAYS = (("expire", "d"), ("flags", "B"), ("status", "B"), ("duration", "l"))
+
+
+def encode(snaps):
+    """{app_key: TabSnapshot} -> (header dict, list blob bytes). Dipanggil di dalam lock cache."""
+    tabs, blobs = [], []
+    offset = 0
+    for app_key, snap in snaps.items():
+        entry = {"app_key": app_key, "blobs": {}}
+        values = json.dumps([snap.headers] + snap.rows, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        parts = [("values", values)]
+        for name, _ in _ARRAYS:
+            parts.append((name, getattr(snap.columns, name).tobytes()))
+        for name, data in parts:
+            entry["blobs"][name] = [offset, len(data)]
+            blobs.append(data)
+            offset += len(data)
+        tabs.append(entry)
+    header = {
+        "saved_at": time.time(),
+        "itemsize": {code: array(code).itemsize for _, code in _ARRAYS},
+        "tabs": tabs,
+    }
+    return header, blobs
+
+
+def write(path: str, header, blobs):
+    head = json.dumps(header).encode("utf-8")
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        f.write(_LEN.pack(len(head)))
+        f.write(head)
+        for data in blobs:
+            f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def read(path: str, app_keys=None):
+    """
+    Return (saved_at epoch, [TabSnapshot]). Raise kalau file gak ada / rusak / beda platform.
+    Snapshot ditandai from_disk, loaded_at-nya mundur sesuai umur file (bukan dianggap baru).
+    """
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if mm[:len(MAGIC)] != MAGIC:
+            raise ValueError("Bukan file snapshot.")
+        pos = len(MAGIC)
+        (head_len,) = _LEN.unpack(mm[pos:pos + _LEN.size])
+        pos += _LEN.size
+        header = json.loads(mm[pos:pos + head_len].decode("utf-8"))
+        base = pos + head_len
+        loaded_at = time.monotonic() - max(0.0, time.time() - header["saved_at"])
+
+        for code, size in header["itemsize"].items():
+            if array(code).itemsize != size:
+                raise ValueError("Snapshot dari platform lain (ukuran array beda).")
+
+        snaps = []
+        for entry in header["tabs"]:
+            if app_keys is not None and entry["app_key"] not in app_keys:
+                continue
+            blobs = entry["blobs"]
+
+            def blob(name):
+                off, n = blobs[name]
+                return mm[base + off:base + off + n]
+
+            values = json.loads(blob("values").decode("utf-8"))
+            arrays = []
+            for name, code in _ARRAYS:
+                a = array(code)
+                a.frombytes(blob(name))
+                arrays.append(a)
+            snap = TabSnapshot(entry["app_key"], values, loaded_at=loaded_at, columns=arrays)
+            snap.from_disk = True
+            snaps.append(snap)
+        return header["saved_at"], snaps